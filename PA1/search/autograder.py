@@ -13,8 +13,10 @@
 
 
 # imports from python standard library
+import contextlib
 import grading
 import imp
+import io
 import optparse
 import os
 import re
@@ -79,6 +81,11 @@ def readCommand(argv):
                     dest = 'noGraphics',
                     action = 'store_true',
                     help = 'No graphics display for pacman games.')
+    parser.add_option('--jobs', '-j',
+                    dest = 'jobs',
+                    type = 'int',
+                    default = 1,
+                    help = 'Grade questions in this many worker processes, without graphics.')
     (options, args) = parser.parse_args(argv)
     return options
 
@@ -243,10 +250,103 @@ def getTestSubdirs(testParser, testRoot, questionToGrade):
     return sorted(os.listdir(testRoot))
 
 
+def loadQuestion(q, testRoot, display):
+    """
+    Parses the CONFIG of question q and returns the question object, without
+    its test cases, along with the CONFIG dictionary.
+    """
+    import testParser
+    import testClasses
+    questionDict = testParser.TestParser(os.path.join(testRoot, q, 'CONFIG')).parse()
+    questionClass = getattr(testClasses, questionDict['class'])
+    return questionClass(questionDict, display), questionDict
+
+
+def loadTestCases(q, question, generateSolutions, testRoot, moduleDict, printTestCase):
+    """
+    Adds the test cases of question q to question, parsing each test and
+    solution file once, and registers a function grading it under the name q
+    in this module.
+    """
+    import testParser
+    subdir_path = os.path.join(testRoot, q)
+    tests = filter(lambda t: re.match('[^#~.].*\.test\Z', t), os.listdir(subdir_path))
+    tests = map(lambda t: re.match('(.*)\.test\Z', t).group(1), tests)
+    for t in sorted(tests):
+        test_file = os.path.join(subdir_path, '%s.test' % t)
+        solution_file = os.path.join(subdir_path, '%s.solution' % t)
+        test_out_file = os.path.join(subdir_path, '%s.test_output' % t)
+        testDict = testParser.TestParser(test_file).parse()
+        if testDict.get("disabled", "false").lower() == "true":
+            continue
+        testDict['test_out_file'] = test_out_file
+        testClass = getattr(projectTestClasses, testDict['class'])
+        testCase = testClass(question, testDict)
+
+        def makefun(testCase, testDict, solution_file):
+            if generateSolutions:
+                # write solution file to disk
+                return lambda grades: testCase.writeSolution(moduleDict, solution_file)
+            else:
+                # read in solution dictionary and pass as an argument
+                solutionDict = testParser.TestParser(solution_file).parse()
+                if printTestCase:
+                    return lambda grades: printTest(testDict, solutionDict) or testCase.execute(grades, moduleDict, solutionDict)
+                else:
+                    return lambda grades: testCase.execute(grades, moduleDict, solutionDict)
+        question.addTestCase(testCase, makefun(testCase, testDict, solution_file))
+
+    # Note extra function is necessary for scoping reasons
+    def makefun(question):
+        return lambda grades: question.execute(grades)
+    setattr(sys.modules[__name__], q, makefun(question))
+    testParser.flushCaches()
+
+
+def initGradingWorker(moduleFiles, generateSolutions, testRoot, muteOutput, printTestCase):
+    global gradingWorkerSetup
+    moduleDict = {}
+    for module in moduleFiles:
+        moduleName = re.match('.*?([^/]*)\.py', moduleFiles[module]).group(1)
+        moduleDict[module] = loadModuleFile(moduleName, moduleFiles[module])
+        setattr(sys.modules[__name__], module, moduleDict[module])
+    gradingWorkerSetup = (moduleDict, generateSolutions,
+                          testRoot, muteOutput, printTestCase)
+
+
+def gradeWorkerQuestion(q):
+    """
+    Loads and grades question q in a worker process, returning the points,
+    messages and printed output for Grades.grade to merge.  The random module
+    is reseeded for every question, so the result does not depend on which
+    questions the worker graded before.
+    """
+    import textDisplay
+    moduleDict, generateSolutions, testRoot, muteOutput, printTestCase = gradingWorkerSetup
+    random.seed(0)
+    question, questionDict = loadQuestion(
+        q, testRoot, textDisplay.NullGraphics())
+    loadTestCases(q, question, generateSolutions,
+                  testRoot, moduleDict, printTestCase)
+    with contextlib.redirect_stdout(io.StringIO()):
+        grades = grading.Grades(projectParams.PROJECT_NAME, [(q, question.getMaxPoints())],
+                                muteOutput=muteOutput)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        grades.gradeQuestion(sys.modules[__name__], q)
+    return grades.points[q], grades.messages[q], output.getvalue()
+
+
 # evaluate student code
 def evaluate(generateSolutions, testRoot, moduleDict, exceptionMap=ERROR_HINT_MAP,
              edxOutput=False, muteOutput=False, gsOutput=False,
-            printTestCase=False, questionToGrade=None, display=None):
+             printTestCase=False, questionToGrade=None, display=None,
+             jobs=1, moduleFiles=None):
+    """
+    With jobs > 1 the questions are graded in a pool of worker processes,
+    which load the modules from moduleFiles, a dictionary from module names
+    to the files moduleDict was loaded from.
+    """
     # imports of testbench code.  note that the testClasses import must follow
     # the import of student code due to dependencies
     import testParser
@@ -262,43 +362,12 @@ def evaluate(generateSolutions, testRoot, moduleDict, exceptionMap=ERROR_HINT_MA
         if not os.path.isdir(subdir_path) or q[0] == '.':
             continue
 
-        # create a question object
-        questionDict = testParser.TestParser(os.path.join(subdir_path, 'CONFIG')).parse()
-        questionClass = getattr(testClasses, questionDict['class'])
-        question = questionClass(questionDict, display)
+        # create a question object; workers load its test cases themselves
+        question, questionDict = loadQuestion(q, testRoot, display)
         questionDicts[q] = questionDict
-
-        # load test cases into question
-        tests = filter(lambda t: re.match('[^#~.].*\.test\Z', t), os.listdir(subdir_path))
-        tests = map(lambda t: re.match('(.*)\.test\Z', t).group(1), tests)
-        for t in sorted(tests):
-            test_file = os.path.join(subdir_path, '%s.test' % t)
-            solution_file = os.path.join(subdir_path, '%s.solution' % t)
-            test_out_file = os.path.join(subdir_path, '%s.test_output' % t)
-            testDict = testParser.TestParser(test_file).parse()
-            if testDict.get("disabled", "false").lower() == "true":
-                continue
-            testDict['test_out_file'] = test_out_file
-            testClass = getattr(projectTestClasses, testDict['class'])
-            testCase = testClass(question, testDict)
-            def makefun(testCase, solution_file):
-                if generateSolutions:
-                    # write solution file to disk
-                    return lambda grades: testCase.writeSolution(moduleDict, solution_file)
-                else:
-                    # read in solution dictionary and pass as an argument
-                    testDict = testParser.TestParser(test_file).parse()
-                    solutionDict = testParser.TestParser(solution_file).parse()
-                    if printTestCase:
-                        return lambda grades: printTest(testDict, solutionDict) or testCase.execute(grades, moduleDict, solutionDict)
-                    else:
-                        return lambda grades: testCase.execute(grades, moduleDict, solutionDict)
-            question.addTestCase(testCase, makefun(testCase, solution_file))
-
-        # Note extra function is necessary for scoping reasons
-        def makefun(question):
-            return lambda grades: question.execute(grades)
-        setattr(sys.modules[__name__], q, makefun(question))
+        if jobs <= 1:
+            loadTestCases(q, question, generateSolutions,
+                          testRoot, moduleDict, printTestCase)
         questions.append((q, question.getMaxPoints()))
 
     grades = grading.Grades(projectParams.PROJECT_NAME, questions,
@@ -308,7 +377,14 @@ def evaluate(generateSolutions, testRoot, moduleDict, exceptionMap=ERROR_HINT_MA
             for prereq in questionDicts[q].get('depends', '').split():
                 grades.addPrereq(q, prereq)
 
-    grades.grade(sys.modules[__name__], bonusPic = projectParams.BONUS_PIC)
+    if jobs <= 1:
+        grades.grade(sys.modules[__name__], bonusPic = projectParams.BONUS_PIC)
+    else:
+        import multiprocessing
+        with multiprocessing.Pool(jobs, initGradingWorker,
+                                  (moduleFiles, generateSolutions, testRoot, muteOutput, printTestCase)) as pool:
+            grades.grade(sys.modules[__name__], bonusPic=projectParams.BONUS_PIC,
+                         startQuestion=lambda q: pool.apply_async(gradeWorkerQuestion, (q,)))
     return grades.points
 
 
@@ -342,11 +418,14 @@ if __name__ == '__main__':
     # moduleDict = loadModuleDict(moduleCodeDict)
 
     moduleDict = {}
+    moduleFiles = {}
     for cp in codePaths:
         moduleName = re.match('.*?([^/]*)\.py', cp).group(1)
-        moduleDict[moduleName] = loadModuleFile(moduleName, os.path.join(options.codeRoot, cp))
+        moduleFiles[moduleName] = os.path.join(options.codeRoot, cp)
+        moduleDict[moduleName] = loadModuleFile(moduleName, moduleFiles[moduleName])
     moduleName = re.match('.*?([^/]*)\.py', options.testCaseCode).group(1)
-    moduleDict['projectTestClasses'] = loadModuleFile(moduleName, os.path.join(options.codeRoot, options.testCaseCode))
+    moduleFiles['projectTestClasses'] = os.path.join(options.codeRoot, options.testCaseCode)
+    moduleDict['projectTestClasses'] = loadModuleFile(moduleName, moduleFiles['projectTestClasses'])
 
 
     if options.runTest != None:
@@ -355,4 +434,6 @@ if __name__ == '__main__':
         evaluate(options.generateSolutions, options.testRoot, moduleDict,
             gsOutput=options.gsOutput,
             edxOutput=options.edxOutput, muteOutput=options.muteOutput, printTestCase=options.printTestCase,
-            questionToGrade=options.gradeQuestion, display=getDisplay(options.gradeQuestion!=None, options))
+            questionToGrade=options.gradeQuestion,
+            display=getDisplay(options.gradeQuestion!=None and options.jobs <= 1, options),
+            jobs=options.jobs, moduleFiles=moduleFiles)
@@ -23,6 +23,8 @@
 from util import *
 import time, os
 import traceback
+import random
+import math
 import sys
 
 #######################
@@ -159,11 +161,63 @@ class AgentState:
     def getDirection(self):
         return self.configuration.getDirection()
 
+class GridColumn:
+    """
+    A view onto one column (fixed x) of a Grid, so that grid[x][y] reads and
+    writes the underlying bits.
+    """
+    __slots__ = ('grid', 'x', 'offset')
+
+    def __init__(self, grid, x):
+        self.grid = grid
+        self.x = x
+        self.offset = x * grid.height
+
+    def _bit(self, y):
+        height = self.grid.height
+        if y < 0:
+            y += height
+        if y < 0 or y >= height:
+            raise IndexError('grid index out of range')
+        return self.offset + y
+
+    def __getitem__(self, y):
+        if 0 <= y < self.grid.height:
+            return (self.grid.bits >> (self.offset + y)) & 1 == 1
+        return (self.grid.bits >> self._bit(y)) & 1 == 1
+
+    def __setitem__(self, y, value):
+        if value not in (False, True):
+            raise Exception('Grids can only contain booleans')
+        bit = 1 << self._bit(y)
+        if value:
+            self.grid.bits |= bit
+        else:
+            self.grid.bits &= ~bit
+
+    def __len__(self):
+        return self.grid.height
+
+    def __iter__(self):
+        bits = self.grid.bits >> self.offset
+        for y in range(self.grid.height):
+            yield (bits >> y) & 1 == 1
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __str__(self):
+        return str(list(self))
+
 class Grid:
     """
-    A 2-dimensional array of objects backed by a list of lists.  Data is accessed
-    via grid[x][y] where (x,y) are positions on a Pacman map with x horizontal,
-    y vertical and the origin (0,0) in the bottom left corner.
+    A 2-dimensional array of booleans packed into the bits of a single Python
+    int.  Data is accessed via grid[x][y] where (x,y) are positions on a
+    Pacman map with x horizontal, y vertical and the origin (0,0) in the
+    bottom left corner.
+
+    Cell (x,y) is stored at bit x * height + y, so copying a grid is O(1),
+    hashing and equality work on one int, and count() is a popcount.
 
     The __str__ method constructs an output that is oriented like a pacman board.
     """
@@ -173,57 +227,88 @@ class Grid:
 
         self.width = width
         self.height = height
-        self.data = [[initialValue for y in range(height)] for x in range(width)]
+        self.bits = 0
+        if initialValue:
+            self.bits = (1 << (width * height)) - 1
         if bitRepresentation:
             self._unpackBits(bitRepresentation)
 
     def __getitem__(self, i):
-        return self.data[i]
+        # Column views are made afresh on every access rather than kept, so
+        # a grid never refers back to itself and copies are freed at once
+        if 0 <= i < self.width:
+            return GridColumn(self, i)
+        if -self.width <= i < 0:
+            return GridColumn(self, i + self.width)
+        raise IndexError('grid index out of range')
 
     def __setitem__(self, key, item):
-        self.data[key] = item
+        column = self[key]
+        for y in range(self.height):
+            column[y] = item[y]
+
+    def __iter__(self):
+        for x in range(self.width):
+            yield self[x]
 
     def __str__(self):
-        out = [[str(self.data[x][y])[0] for x in range(self.width)] for y in range(self.height)]
+        out = [[str(self[x][y])[0] for x in range(self.width)] for y in range(self.height)]
         out.reverse()
         return '\n'.join([''.join(x) for x in out])
 
     def __eq__(self, other):
         if other == None: return False
-        return self.data == other.data
+        return self.bits == other.bits and self.width == other.width and self.height == other.height
 
     def __hash__(self):
-        # return hash(str(self))
-        base = 1
-        h = 0
-        for l in self.data:
-            for i in l:
-                if i:
-                    h += base
-                base *= 2
-        return hash(h)
+        return hash(self.bits)
+
+    def get(self, x, y):
+        "Returns self[x][y] without making a column view"
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return (self.bits >> (x * self.height + y)) & 1 == 1
+        return self[x][y]
+
+    def set(self, x, y, value):
+        "Sets self[x][y] to value without making a column view"
+        if value not in (False, True):
+            raise Exception('Grids can only contain booleans')
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            self[x][y] = value
+            return
+        bit = 1 << (x * self.height + y)
+        if value:
+            self.bits |= bit
+        else:
+            self.bits &= ~bit
 
     def copy(self):
         g = Grid(self.width, self.height)
-        g.data = [x[:] for x in self.data]
+        g.bits = self.bits
         return g
 
     def deepCopy(self):
         return self.copy()
 
     def shallowCopy(self):
-        g = Grid(self.width, self.height)
-        g.data = self.data
-        return g
+        # Ints are immutable, so sharing them is no cheaper than a copy
+        return self.copy()
 
-    def count(self, item =True ):
-        return sum([x.count(item) for x in self.data])
+    def count(self, item=True):
+        trues = bin(self.bits).count('1')
+        if item:
+            return trues
+        return self.width * self.height - trues
 
-    def asList(self, key = True):
+    def asList(self, key=True):
+        bits = self.bits
+        if not key:
+            bits = ~bits & ((1 << (self.width * self.height)) - 1)
         list = []
-        for x in range(self.width):
-            for y in range(self.height):
-                if self[x][y] == key: list.append( (x,y) )
+        while bits:
+            lowest = bits & -bits
+            list.append(self._cellIndexToPosition(lowest.bit_length() - 1))
+            bits ^= lowest
         return list
 
     def packBits(self):
@@ -368,6 +453,50 @@ class Actions:
         return (x + dx, y + dy)
     getSuccessor = staticmethod(getSuccessor)
 
+class ZobristTable:
+    """
+    Fixed random 64-bit keys for every cell of a board, one set for food and
+    one for capsules.  The hash of a set of cells is the XOR of their keys, so
+    adding or removing a single item updates it in O(1).
+
+    Keys come from a private generator so building a table never disturbs the
+    global random state that games are seeded with.
+    """
+    _tables = {}
+
+    def __init__(self, width, height):
+        rng = random.Random('zobrist:%d:%d' % (width, height))
+        self.height = height
+        self.food = [rng.getrandbits(64) for i in range(width * height)]
+        self.capsules = [rng.getrandbits(64) for i in range(width * height)]
+
+    def forBoard(width, height):
+        key = (width, height)
+        if key not in ZobristTable._tables:
+            ZobristTable._tables[key] = ZobristTable(width, height)
+        return ZobristTable._tables[key]
+    forBoard = staticmethod(forBoard)
+
+    def foodKey(self, position):
+        x, y = position
+        return self.food[x * self.height + y]
+
+    def capsuleKey(self, position):
+        x, y = position
+        return self.capsules[x * self.height + y]
+
+    def hashFood(self, food):
+        h = 0
+        for position in food.asList():
+            h ^= self.foodKey(position)
+        return h
+
+    def hashCapsules(self, capsules):
+        h = 0
+        for position in capsules:
+            h ^= self.capsuleKey(position)
+        return h
+
 class GameStateData:
     """
 
@@ -377,9 +506,16 @@ class GameStateData:
         Generates a new data packet by copying information from its predecessor.
         """
         if prevState != None:
-            self.food = prevState.food.shallowCopy()
-            self.capsules = prevState.capsules[:]
-            self.agentStates = self.copyAgentStates( prevState.agentStates )
+            # Food, capsules and agent states are shared with the predecessor
+            # and only copied when a rule is about to change them
+            self.food = prevState.food
+            self.capsules = prevState.capsules
+            self.agentStates = prevState.agentStates[:]
+            self._ownedAgentStates = [False] * len(self.agentStates)
+            self._zobrist = prevState._zobrist
+            self._foodHash = prevState._foodHash
+            self._capsuleHash = prevState._capsuleHash
+            self._agentHashes = prevState._agentHashes[:]
             self.layout = prevState.layout
             self._eaten = prevState._eaten
             self.score = prevState.score
@@ -395,6 +531,9 @@ class GameStateData:
     def deepCopy( self ):
         state = GameStateData( self )
         state.food = self.food.deepCopy()
+        state.capsules = self.capsules[:]
+        state.agentStates = self.copyAgentStates(self.agentStates)
+        state._ownedAgentStates = [True] * len(state.agentStates)
         state.layout = self.layout.deepCopy()
         state._agentMoved = self._agentMoved
         state._foodEaten = self._foodEaten
@@ -408,6 +547,32 @@ class GameStateData:
             copiedStates.append( agentState.copy() )
         return copiedStates
 
+    def writableAgentState(self, index):
+        """
+        Returns the state of agent 'index' for modification, first copying it
+        if it is still shared with the predecessor state.
+        """
+        if not self._ownedAgentStates[index]:
+            self.agentStates[index] = self.agentStates[index].copy()
+            self._ownedAgentStates[index] = True
+        self._agentHashes[index] = None
+        return self.agentStates[index]
+
+    def removeFood(self, position):
+        """
+        Removes the food at 'position', copying the food grid first since it
+        may be shared with the predecessor state.
+        """
+        x, y = position
+        self.food = self.food.copy()
+        self.food.set(x, y, False)
+        self._foodHash ^= self._zobrist.foodKey(position)
+
+    def removeCapsule(self, position):
+        self.capsules = self.capsules[:]
+        self.capsules.remove(position)
+        self._capsuleHash ^= self._zobrist.capsuleKey(position)
+
     def __eq__( self, other ):
         """
         Allows two states to be compared.
@@ -420,21 +585,25 @@ class GameStateData:
         if not self.score == other.score: return False
         return True
 
-    def __hash__( self ):
+    def __hash__(self):
         """
         Allows states to be keys of dictionaries.
+
+        The food and capsule parts are Zobrist hashes maintained as items are
+        eaten, and each agent's hash is cached until the agent is next handed
+        out by writableAgentState, so hashing never touches the board.
         """
-        for i, state in enumerate( self.agentStates ):
-            try:
-                int(hash(state))
-            except TypeError as e:
-                print(e)
-                #hash(state)
-        return int((hash(tuple(self.agentStates)) + 13*hash(self.food) + 113* hash(tuple(self.capsules)) + 7 * hash(self.score)) % 1048575 )
+        h = self._foodHash ^ self._capsuleHash ^ hash(self.score)
+        agentHashes = self._agentHashes
+        for index in range(len(agentHashes)):
+            if agentHashes[index] is None:
+                agentHashes[index] = hash((index, self.agentStates[index]))
+            h ^= agentHashes[index]
+        return h
 
     def __str__( self ):
         width, height = self.layout.width, self.layout.height
-        map = Grid(width, height)
+        map = [[' ' for y in range(height)] for x in range(width)]
         if type(self.food) == type((1,2)):
             self.food = reconstituteGrid(self.food)
         for x in range(width):
@@ -455,7 +624,9 @@ class GameStateData:
         for x, y in self.capsules:
             map[x][y] = 'o'
 
-        return str(map) + ("\nScore: %d\n" % self.score)
+        rows = [''.join([map[x][y] for x in range(width)]) for y in range(height)]
+        rows.reverse()
+        return '\n'.join(rows) + ("\nScore: %d\n" % self.score)
 
     def _foodWallStr( self, hasFood, hasWall ):
         if hasFood:
@@ -503,6 +674,11 @@ class GameStateData:
                 else: numGhosts += 1
             self.agentStates.append( AgentState( Configuration( pos, Directions.STOP), isPacman) )
         self._eaten = [False for a in self.agentStates]
+        self._ownedAgentStates = [True for a in self.agentStates]
+        self._zobrist = ZobristTable.forBoard(layout.width, layout.height)
+        self._foodHash = self._zobrist.hashFood(self.food)
+        self._capsuleHash = self._zobrist.hashCapsules(self.capsules)
+        self._agentHashes = [None for a in self.agentStates]
 
 try:
     import boinc
@@ -515,7 +691,7 @@ class Game:
     The Game manages the control flow, soliciting actions from agents.
     """
 
-    def __init__( self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False ):
+    def __init__( self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False, fast=False, timeoutBackend='signal' ):
         self.agentCrashed = False
         self.agents = agents
         self.display = display
@@ -524,6 +700,8 @@ class Game:
         self.gameOver = False
         self.muteAgents = muteAgents
         self.catchExceptions = catchExceptions
+        self.fast = fast
+        self.timeoutBackend = timeoutBackend
         self.moveHistory = []
         self.totalAgentTimes = [0 for agent in agents]
         self.totalAgentTimeWarnings = [0 for agent in agents]
@@ -544,6 +722,18 @@ class Game:
         self.agentCrashed = True
         self.rules.agentCrash(self, agentIndex)
 
+    def timed(self, function, timeout, used=0):
+        """
+        Wraps function to time out after timeout seconds less the time
+        already used.  The 'signal' backend uses SIGALRM, which only works in
+        the main thread and rounds the time left up to whole seconds, and to
+        at least one, since an alarm of zero seconds never goes off; the
+        'watchdog' backend works from any thread and keeps fractions.
+        """
+        if self.timeoutBackend == 'watchdog':
+            return WatchdogTimeoutFunction(function, timeout - used)
+        return TimeoutFunction(function, max(1, int(math.ceil(timeout - used))))
+
     OLD_STDOUT = None
     OLD_STDERR = None
 
@@ -568,6 +758,9 @@ class Game:
         """
         Main control loop for game play.
         """
+        if self.fast:
+            return self.runFast()
+
         self.display.initialize(self.state.data)
         self.numMoves = 0
 
@@ -587,7 +780,7 @@ class Game:
                 self.mute(i)
                 if self.catchExceptions:
                     try:
-                        timed_func = TimeoutFunction(agent.registerInitialState, int(self.rules.getMaxStartupTime(i)))
+                        timed_func = self.timed(agent.registerInitialState, self.rules.getMaxStartupTime(i))
                         try:
                             start_time = time.time()
                             timed_func(self.state.deepCopy())
@@ -621,7 +814,7 @@ class Game:
                 self.mute(agentIndex)
                 if self.catchExceptions:
                     try:
-                        timed_func = TimeoutFunction(agent.observationFunction, int(self.rules.getMoveTimeout(agentIndex)))
+                        timed_func = self.timed(agent.observationFunction, self.rules.getMoveTimeout(agentIndex))
                         try:
                             start_time = time.time()
                             observation = timed_func(self.state.deepCopy())
@@ -644,7 +837,7 @@ class Game:
             self.mute(agentIndex)
             if self.catchExceptions:
                 try:
-                    timed_func = TimeoutFunction(agent.getAction, int(self.rules.getMoveTimeout(agentIndex)) - int(move_time))
+                    timed_func = self.timed(agent.getAction, self.rules.getMoveTimeout(agentIndex), move_time)
                     try:
                         start_time = time.time()
                         if skip_action:
@@ -727,3 +920,55 @@ class Game:
                     self.unmute()
                     return
         self.display.finish()
+
+    def runFast(self):
+        """
+        Headless control loop used instead of run when the game is created
+        with fast=True.  Agents are trusted: they are handed the game's own
+        states rather than deep copies, they have no time limits and their
+        output is never muted.  Which agents define registerInitialState,
+        observationFunction and final is looked up once per game instead of
+        on every move.  Agent errors still end the game as a crash when
+        catchExceptions is set.
+        """
+        self.display.initialize(self.state.data)
+        self.numMoves = 0
+        for i, agent in enumerate(self.agents):
+            if not agent:
+                # this is a null agent, meaning it failed to load
+                print("Agent %d failed to load" % i, file=sys.stderr)
+                self._agentCrash(i, quiet=True)
+                return
+
+        observers = [getattr(agent, 'observationFunction', None) for agent in self.agents]
+        getActions = [agent.getAction for agent in self.agents]
+        numAgents = len(self.agents)
+
+        agentIndex = 0
+        try:
+            for agentIndex, agent in enumerate(self.agents):
+                if hasattr(agent, 'registerInitialState'):
+                    agent.registerInitialState(self.state)
+
+            agentIndex = self.startingIndex
+            while not self.gameOver:
+                observation = self.state
+                if observers[agentIndex] is not None:
+                    observation = observers[agentIndex](observation)
+                action = getActions[agentIndex](observation)
+
+                self.moveHistory.append((agentIndex, action))
+                self.state = self.state.generateSuccessor(agentIndex, action)
+                self.display.update(self.state.data)
+                self.rules.process(self.state, self)
+                agentIndex = (agentIndex + 1) % numAgents
+
+            for agentIndex, agent in enumerate(self.agents):
+                if hasattr(agent, 'final'):
+                    agent.final(self.state)
+        except Exception:
+            if not self.catchExceptions:
+                raise
+            self._agentCrash(agentIndex)
+            return
+        self.display.finish()
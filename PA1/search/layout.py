@@ -14,11 +14,21 @@
 
 from util import manhattanDistance
 from game import Grid
+from game import Actions
+from game import Configuration
+from game import Directions
 import os
 import random
+import array
+import hashlib
+import pickle
 from functools import reduce
 
 VISIBILITY_MATRIX_CACHE = {}
+MAZE_DISTANCE_CACHE = {}
+# Directory that complete maze distance tables are saved to and loaded from
+# when getMazeDistances is not given one, set with pacman.py --distanceCache
+MAZE_DISTANCE_DIR = None
 
 class Layout:
     """
@@ -36,6 +46,8 @@ class Layout:
         self.processLayoutText(layoutText)
         self.layoutText = layoutText
         self.totalFood = len(self.food.asList())
+        self.mazeDistances = None
+        self.legalMoves = None
         # self.initializeVisibilityMatrix()
 
     def getNumGhosts(self):
@@ -47,7 +59,10 @@ class Layout:
             from game import Directions
             vecs = [(-0.5,0), (0.5,0),(0,-0.5),(0,0.5)]
             dirs = [Directions.NORTH, Directions.SOUTH, Directions.WEST, Directions.EAST]
-            vis = Grid(self.width, self.height, {Directions.NORTH:set(), Directions.SOUTH:set(), Directions.EAST:set(), Directions.WEST:set(), Directions.STOP:set()})
+            # One dictionary of visible positions per cell: Grids only hold
+            # booleans, so the matrix is a list of columns like a Grid's
+            vis = [[dict((direction, set()) for direction in dirs + [Directions.STOP])
+                    for y in range(self.height)] for x in range(self.width)]
             for x in range(self.width):
                 for y in range(self.height):
                     if self.walls[x][y] == False:
@@ -56,12 +71,49 @@ class Layout:
                             nextx, nexty = x + dx, y + dy
                             while (nextx + nexty) != int(nextx) + int(nexty) or not self.walls[int(nextx)][int(nexty)] :
                                 vis[x][y][direction].add((nextx, nexty))
-                                nextx, nexty = x + dx, y + dy
+                                nextx, nexty = nextx + dx, nexty + dy
             self.visibility = vis
             VISIBILITY_MATRIX_CACHE[reduce(str.__add__, self.layoutText)] = vis
         else:
             self.visibility = VISIBILITY_MATRIX_CACHE[reduce(str.__add__, self.layoutText)]
 
+    def getMazeDistances(self, cacheDir=None):
+        """
+        Returns the MazeDistances table for this layout, which is shared by
+        all layouts with the same text and fills in as it is used.  If a
+        cacheDir is given when the table is first created, or else
+        MAZE_DISTANCE_DIR is set, the complete table is loaded from a file
+        there named after a hash of the layout text, or computed and saved if
+        there is no such file.
+        """
+        if cacheDir is None:
+            cacheDir = MAZE_DISTANCE_DIR
+        if self.mazeDistances is None:
+            key = '\n'.join(self.layoutText)
+            if key not in MAZE_DISTANCE_CACHE:
+                distances = MazeDistances(self.walls)
+                if cacheDir is not None:
+                    path = os.path.join(cacheDir, hashlib.sha1(key.encode()).hexdigest() + '.dist')
+                    if os.path.exists(path):
+                        distances.load(path)
+                    else:
+                        distances.save(path)
+                MAZE_DISTANCE_CACHE[key] = distances
+            self.mazeDistances = MAZE_DISTANCE_CACHE[key]
+        return self.mazeDistances
+
+    def getMazeDistance(self, pos1, pos2):
+        return self.getMazeDistances().getDistance(pos1, pos2)
+
+    def getLegalMoves(self):
+        """
+        Returns the LegalMoves table for this layout, building it the first
+        time it is asked for.
+        """
+        if self.legalMoves is None:
+            self.legalMoves = LegalMoves(self.walls)
+        return self.legalMoves
+
     def isWall(self, pos):
         x, col = pos
         return self.walls[x][col]
@@ -91,7 +143,10 @@ class Layout:
         return "\n".join(self.layoutText)
 
     def deepCopy(self):
-        return Layout(self.layoutText[:])
+        layout = Layout(self.layoutText[:])
+        layout.mazeDistances = self.mazeDistances
+        layout.legalMoves = self.legalMoves
+        return layout
 
     def processLayoutText(self, layoutText):
         """
@@ -129,6 +184,187 @@ class Layout:
         elif layoutChar in  ['1', '2', '3', '4']:
             self.agentPositions.append( (int(layoutChar), (x,y)))
             self.numGhosts += 1
+
+class LegalMoves:
+    """
+    The moves available at every open cell of a layout, worked out once from
+    its walls so the game rules can look them up instead of testing walls on
+    every call.  The tables hold tuples and the lookups hand out fresh lists,
+    so callers may still edit what they get back.  Agents caught between two
+    cells, like slowed scared ghosts, are passed on to Actions.  The table
+    of neighbouring cells is only built the first time one is asked for.
+    """
+
+    def __init__(self, walls):
+        self.walls = walls
+        self.pacman = {}
+        self.ghost = {}
+        self.neighbors = None
+        for x in range(walls.width):
+            for y in range(walls.height):
+                if walls[x][y]:
+                    continue
+                cell = (x, y)
+                possible = Actions.getPossibleActions(
+                    Configuration(cell, Directions.STOP), walls)
+                self.pacman[cell] = tuple(possible)
+                for direction in Actions._directions:
+                    self.ghost[cell, direction] = tuple(
+                        LegalMoves.ghostActions(possible, direction))
+
+    def ghostActions(possible, direction):
+        """
+        Ghosts cannot stop, and cannot turn around unless they reach a dead
+        end.
+        """
+        actions = [action for action in possible if action != Directions.STOP]
+        reverse = Actions.reverseDirection(direction)
+        if reverse in actions and len(actions) > 1:
+            actions.remove(reverse)
+        return actions
+    ghostActions = staticmethod(ghostActions)
+
+    def getPacmanActions(self, config):
+        actions = self.pacman.get(config.pos)
+        if actions is None:
+            return Actions.getPossibleActions(config, self.walls)
+        return list(actions)
+
+    def getGhostActions(self, config):
+        actions = self.ghost.get((config.pos, config.direction))
+        if actions is None:
+            return LegalMoves.ghostActions(
+                Actions.getPossibleActions(config, self.walls), config.direction)
+        return list(actions)
+
+    def getLegalNeighbors(self, position):
+        if self.neighbors is None:
+            self.neighbors = dict((cell, tuple(Actions.getLegalNeighbors(cell, self.walls)))
+                                  for cell in self.pacman)
+        x, y = position
+        neighbors = self.neighbors.get((int(x + 0.5), int(y + 0.5)))
+        if neighbors is None:
+            return Actions.getLegalNeighbors(position, self.walls)
+        return list(neighbors)
+
+
+class MazeDistances:
+    """
+    Shortest path lengths through the maze between the open cells of a
+    layout.  The first time distances from a source cell are needed, a
+    breadth first search from it stores them as a row of unsigned shorts,
+    along with the order the search reached the other cells in.  After that
+    getDistance is an O(1) lookup, and getClosest scans cells nearest first
+    without a search queue.  A table for one layout is shared through
+    Layout.getMazeDistances and can be saved to disk with save.
+    """
+
+    UNREACHABLE = 0xFFFF
+
+    def __init__(self, walls):
+        self.height = walls.height
+        self.cells = [(x, y) for x in range(walls.width)
+                      for y in range(walls.height) if not walls[x][y]]
+        if len(self.cells) >= self.UNREACHABLE:
+            raise Exception('Layout too large for a maze distance table')
+        self.cellIndex = dict((cell, i) for i, cell in enumerate(self.cells))
+        # Grid bit of each cell, see game.Grid
+        self.cellBits = [x * walls.height + y for x, y in self.cells]
+        self.neighbors = []
+        for x, y in self.cells:
+            adjacent = [(x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)]
+            self.neighbors.append([self.cellIndex[cell]
+                                   for cell in adjacent if cell in self.cellIndex])
+        self.rows = [None] * len(self.cells)
+        self.orders = [None] * len(self.cells)
+
+    def search(self, source):
+        """
+        Breadth first search from the cell numbered source, filling in its
+        row of distances and the order cells were reached in.
+        """
+        unreachable = self.UNREACHABLE
+        neighbors = self.neighbors
+        row = array.array('H', [unreachable]) * len(self.cells)
+        row[source] = 0
+        order = array.array('H', [source])
+        i = 0
+        while i < len(order):
+            cell = order[i]
+            i += 1
+            distance = row[cell] + 1
+            for next in neighbors[cell]:
+                if row[next] == unreachable:
+                    row[next] = distance
+                    order.append(next)
+        self.rows[source] = row
+        self.orders[source] = order
+        return row
+
+    def getDistance(self, pos1, pos2):
+        """
+        Returns the maze distance between two open cells, or None if there
+        is no path between them.
+        """
+        i = self.cellIndex[pos1]
+        j = self.cellIndex[pos2]
+        row = self.rows[i]
+        if row is None:
+            if self.rows[j] is not None:
+                # Distances are symmetric
+                row, j = self.rows[j], i
+            else:
+                row = self.search(i)
+        distance = row[j]
+        if distance == self.UNREACHABLE:
+            return None
+        return distance
+
+    def getClosest(self, pos, grid):
+        """
+        Returns the maze distance from pos to the closest cell that is True
+        in grid, or None if no such cell can be reached.
+        """
+        i = self.cellIndex[pos]
+        if self.orders[i] is None:
+            self.search(i)
+        bits = grid.bits
+        cellBits = self.cellBits
+        for j in self.orders[i]:
+            if bits >> cellBits[j] & 1:
+                return self.rows[i][j]
+        return None
+
+    def computeAll(self):
+        for i in range(len(self.cells)):
+            if self.rows[i] is None:
+                self.search(i)
+
+    def save(self, path):
+        """
+        Computes every row of the table and writes it to path.  The file is
+        written under a temporary name and then renamed, so processes
+        loading it at the same time never see part of it.
+        """
+        self.computeAll()
+        temporary = '%s.%d.tmp' % (path, os.getpid())
+        with open(temporary, 'wb') as f:
+            pickle.dump([(row.tobytes(), order.tobytes())
+                         for row, order in zip(self.rows, self.orders)], f)
+        os.replace(temporary, path)
+
+    def load(self, path):
+        """Reads a table written by save for the same layout"""
+        with open(path, 'rb') as f:
+            saved = pickle.load(f)
+        if len(saved) != len(self.cells):
+            raise Exception('Maze distance file %s is for another layout' % path)
+        for i, (row, order) in enumerate(saved):
+            self.rows[i] = array.array('H')
+            self.rows[i].frombytes(row)
+            self.orders[i] = array.array('H')
+            self.orders[i].frombytes(order)
+
 def getLayout(name, back = 2):
     if name.endswith('.lay'):
         layout = tryToLoad('layouts/' + name)
@@ -41,8 +41,8 @@ The keys are 'a', 's', 'd', and 'w' to move (or arrow keys).  Have fun!
 """
 from game import GameStateData
 from game import Game
-from game import Directions
 from game import Actions
+from game import Configuration
 from util import nearestPoint
 from util import manhattanDistance
 import util, layout
@@ -112,7 +112,7 @@ class GameState:
         if agentIndex == 0:
             state.data.scoreChange += -TIME_PENALTY # Penalty for waiting around
         else:
-            GhostRules.decrementTimer( state.data.agentStates[agentIndex] )
+            GhostRules.decrementTimer(state.data.writableAgentState(agentIndex))
 
         # Resolve multi-agent effects
         GhostRules.checkDeath( state, agentIndex )
@@ -201,10 +201,10 @@ class GameState:
         return self.data.layout.walls
 
     def hasFood(self, x, y):
-        return self.data.food[x][y]
+        return self.data.food.get(x, y)
 
     def hasWall(self, x, y):
-        return self.data.layout.walls[x][y]
+        return self.data.layout.walls.get(x, y)
 
     def isLose( self ):
         return self.data._lose
@@ -268,14 +268,15 @@ class ClassicGameRules:
     These game rules manage the control flow of a game, deciding when
     and how the game starts and ends.
     """
-    def __init__(self, timeout=30):
+    def __init__(self, timeout=30, timeoutBackend='signal'):
         self.timeout = timeout
+        self.timeoutBackend = timeoutBackend
 
-    def newGame( self, layout, pacmanAgent, ghostAgents, display, quiet = False, catchExceptions=False):
+    def newGame( self, layout, pacmanAgent, ghostAgents, display, quiet = False, catchExceptions=False, fast=False):
         agents = [pacmanAgent] + ghostAgents[:layout.getNumGhosts()]
         initState = GameState()
         initState.initialize( layout, len(ghostAgents) )
-        game = Game(agents, display, self, catchExceptions=catchExceptions)
+        game = Game(agents, display, self, catchExceptions=catchExceptions, fast=fast, timeoutBackend=self.timeoutBackend)
         game.state = initState
         self.initialState = initState.deepCopy()
         self.quiet = quiet
@@ -331,7 +332,7 @@ class PacmanRules:
         """
         Returns a list of possible actions.
         """
-        return Actions.getPossibleActions( state.getPacmanState().configuration, state.data.layout.walls )
+        return state.data.layout.getLegalMoves().getPacmanActions( state.getPacmanState().configuration )
     getLegalActions = staticmethod( getLegalActions )
 
     def applyAction( state, action ):
@@ -342,7 +343,7 @@ class PacmanRules:
         if action not in legal:
             raise Exception("Illegal action " + str(action))
 
-        pacmanState = state.data.agentStates[0]
+        pacmanState = state.data.writableAgentState(0)
 
         # Update Configuration
         vector = Actions.directionToVector( action, PacmanRules.PACMAN_SPEED )
@@ -359,10 +360,9 @@ class PacmanRules:
     def consume( position, state ):
         x,y = position
         # Eat food
-        if state.data.food[x][y]:
+        if state.data.food.get(x, y):
             state.data.scoreChange += 10
-            state.data.food = state.data.food.copy()
-            state.data.food[x][y] = False
+            state.data.removeFood(position)
             state.data._foodEaten = position
             # TODO: cache numFood?
             numFood = state.getNumFood()
@@ -371,11 +371,11 @@ class PacmanRules:
                 state.data._win = True
         # Eat capsule
         if( position in state.getCapsules() ):
-            state.data.capsules.remove( position )
+            state.data.removeCapsule(position)
             state.data._capsuleEaten = position
             # Reset all ghosts' scared timers
             for index in range( 1, len( state.data.agentStates ) ):
-                state.data.agentStates[index].scaredTimer = SCARED_TIME
+                state.data.writableAgentState(index).scaredTimer = SCARED_TIME
     consume = staticmethod( consume )
 
 class GhostRules:
@@ -389,13 +389,7 @@ class GhostRules:
         reach a dead end, but can turn 90 degrees at intersections.
         """
         conf = state.getGhostState( ghostIndex ).configuration
-        possibleActions = Actions.getPossibleActions( conf, state.data.layout.walls )
-        reverse = Actions.reverseDirection( conf.direction )
-        if Directions.STOP in possibleActions:
-            possibleActions.remove( Directions.STOP )
-        if reverse in possibleActions and len( possibleActions ) > 1:
-            possibleActions.remove( reverse )
-        return possibleActions
+        return state.data.layout.getLegalMoves().getGhostActions( conf )
     getLegalActions = staticmethod( getLegalActions )
 
     def applyAction( state, action, ghostIndex):
@@ -404,7 +398,7 @@ class GhostRules:
         if action not in legal:
             raise Exception("Illegal ghost action " + str(action))
 
-        ghostState = state.data.agentStates[ghostIndex]
+        ghostState = state.data.writableAgentState(ghostIndex)
         speed = GhostRules.GHOST_SPEED
         if ghostState.scaredTimer > 0: speed /= 2.0
         vector = Actions.directionToVector( action, speed )
@@ -414,7 +408,8 @@ class GhostRules:
     def decrementTimer( ghostState):
         timer = ghostState.scaredTimer
         if timer == 1:
-            ghostState.configuration.pos = nearestPoint( ghostState.configuration.pos )
+            ghostState.configuration = Configuration(nearestPoint(
+                ghostState.configuration.pos), ghostState.configuration.direction)
         ghostState.scaredTimer = max( 0, timer - 1 )
     decrementTimer = staticmethod( decrementTimer )
 
@@ -435,10 +430,12 @@ class GhostRules:
 
     def collide( state, ghostState, agentIndex):
         if ghostState.scaredTimer > 0:
+            ghostState = state.data.writableAgentState(agentIndex)
             state.data.scoreChange += 200
             GhostRules.placeGhost(state, ghostState)
             ghostState.scaredTimer = 0
             # Added for first-person
+            state.data._eaten = state.data._eaten[:]
             state.data._eaten[agentIndex] = True
         else:
             if not state.data._win:
@@ -521,13 +518,23 @@ def readCommand( argv ):
                       help=default('Time to delay between frames; <0 means keyboard'), default=0.1)
     parser.add_option('-c', '--catchExceptions', action='store_true', dest='catchExceptions',
                       help='Turns on exception handling and timeouts during games', default=False)
-    parser.add_option('--timeout', dest='timeout', type='int',
+    parser.add_option('--timeout', dest='timeout', type='float',
                       help=default('Maximum length of time an agent can spend computing in a single game'), default=30)
+    parser.add_option('--timeoutBackend', dest='timeoutBackend', type='choice', choices=['signal', 'watchdog'],
+                      help=default('How timeouts are enforced with -c: signal (SIGALRM, whole seconds, main thread only) or watchdog (a timer thread, fractions of a second, any thread)'), default='signal')
+    parser.add_option('--workers', dest='workers', type='int',
+                      help=default('Number of processes to play test games in, without graphics'), default=1)
+    parser.add_option('--fast', action='store_true', dest='fast',
+                      help='Headless simulation that trusts agents not to modify the states they are given: no graphics, state copies, time limits or muting', default=False)
+    parser.add_option('--distanceCache', dest='distanceCache',
+                      help='Directory to save and reuse complete maze distance tables of layouts in', default=None)
 
     options, otherjunk = parser.parse_args(argv)
     if len(otherjunk) != 0:
         raise Exception('Command line input not understood: ' + str(otherjunk))
     args = dict()
+    if options.fast:
+        options.quietGraphics = True
 
     # Fix the random seed
     if options.fixRandomSeed: random.seed('cs188')
@@ -570,6 +577,16 @@ def readCommand( argv ):
     args['record'] = options.record
     args['catchExceptions'] = options.catchExceptions
     args['timeout'] = options.timeout
+    args['timeoutBackend'] = options.timeoutBackend
+    if options.timeoutBackend == 'signal' and options.timeout != int(options.timeout):
+        print('Note: the signal timeout backend rounds --timeout up to whole seconds; '
+              'use --timeoutBackend watchdog for fractional timeouts')
+    args['workers'] = options.workers
+    args['fast'] = options.fast
+    if options.distanceCache:
+        if not os.path.isdir(options.distanceCache):
+            os.makedirs(options.distanceCache)
+        layout.MAZE_DISTANCE_DIR = options.distanceCache
 
     # Special case: recorded games don't use the runGames method or args structure
     if options.gameToReplay != None:
@@ -625,14 +642,89 @@ def replayGame( layout, actions, display ):
 
     display.finish()
 
-def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0, catchExceptions=False, timeout=30 ):
+class FinishedGame:
+    """
+    What runGames keeps of a game played in a worker process: the final
+    state, the move history and whether an agent crashed or timed out.
+    """
+
+    def __init__(self, game):
+        self.state = game.state
+        self.moveHistory = game.moveHistory
+        self.agentCrashed = game.agentCrashed
+        self.agentTimeout = game.agentTimeout
+
+# The layout, agents and rules settings shared by a worker's games
+gameWorkerSetup = None
+
+def initGameWorker(layout, pacman, ghosts, catchExceptions, timeout, fast, timeoutBackend='signal'):
+    global gameWorkerSetup
+    gameWorkerSetup = (layout, pacman, ghosts, catchExceptions, timeout, fast, timeoutBackend)
+
+def playWorkerGame(task):
+    """
+    Plays one game in a worker process.  Every game starts from a fresh copy
+    of the agents, so its result depends only on its seed and not on the
+    games the worker played before it.
+    """
+    import copy
+    import textDisplay
+    i, seed = task
+    layout, pacman, ghosts, catchExceptions, timeout, fast, timeoutBackend = gameWorkerSetup
+    random.seed(seed)
+    pacman, ghosts = copy.deepcopy((pacman, ghosts))
+    rules = ClassicGameRules(timeout, timeoutBackend)
+    game = rules.newGame(layout, pacman, ghosts,
+                         textDisplay.NullGraphics(), False, catchExceptions, fast)
+    game.run()
+    return i, FinishedGame(game)
+
+def runParallelGames(layout, pacman, ghosts, gameNumbers, record, catchExceptions, timeout, workers, fast, timeoutBackend='signal'):
+    """
+    Plays the games numbered gameNumbers, without graphics, in a pool of
+    worker processes.  Game i is seeded with a base seed drawn from random
+    plus i, so with --fixRandomSeed the same games are played for any number
+    of workers above one.  With a single worker runGames plays the games in
+    this process, through the one random stream, so their results differ.
+    Each game is recorded as soon as it finishes; the games are returned in
+    order.
+    """
+    import multiprocessing
+    baseSeed = random.randrange(2 ** 31)
+    tasks = [(i, baseSeed + i) for i in gameNumbers]
+    finished = {}
+    with multiprocessing.Pool(workers, initGameWorker,
+                              (layout, pacman, ghosts, catchExceptions, timeout, fast, timeoutBackend)) as pool:
+        for i, game in pool.imap_unordered(playWorkerGame, tasks):
+            finished[i] = game
+            if record:
+                recordGame(layout, game, i)
+    return [finished[i] for i in gameNumbers]
+
+def recordGame(layout, game, i):
+    import time
+    import pickle
+    fname = ('recorded-game-%d' % (i + 1)) + \
+        '-'.join([str(t) for t in time.localtime()[1:6]])
+    f = open(fname, 'wb')
+    components = {'layout': layout, 'actions': game.moveHistory}
+    pickle.dump(components, f)
+    f.close()
+
+def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0, catchExceptions=False, timeout=30, workers=1, fast=False, timeoutBackend='signal' ):
     import __main__
     __main__.__dict__['_display'] = display
 
-    rules = ClassicGameRules(timeout)
+    rules = ClassicGameRules(timeout, timeoutBackend)
     games = []
 
-    for i in range( numGames ):
+    # Training games update the agents, so only test games are played in
+    # parallel, by copies of the trained agents
+    numSerialGames = numGames
+    if workers > 1:
+        numSerialGames = min(numTraining, numGames)
+
+    for i in range( numSerialGames ):
         beQuiet = i < numTraining
         if beQuiet:
                 # Suppress output and graphics
@@ -642,17 +734,16 @@ def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0
         else:
             gameDisplay = display
             rules.quiet = False
-        game = rules.newGame( layout, pacman, ghosts, gameDisplay, beQuiet, catchExceptions)
+        game = rules.newGame( layout, pacman, ghosts, gameDisplay, beQuiet, catchExceptions, fast)
         game.run()
         if not beQuiet: games.append(game)
 
         if record:
-            import time, pickle
-            fname = ('recorded-game-%d' % (i + 1)) +  '-'.join([str(t) for t in time.localtime()[1:6]])
-            f = open(fname, 'wb')
-            components = {'layout': layout, 'actions': game.moveHistory}
-            pickle.dump(components, f)
-            f.close()
+            recordGame(layout, game, i)
+
+    if numSerialGames < numGames:
+        games += runParallelGames(layout, pacman, ghosts, range(numSerialGames, numGames),
+                                  record, catchExceptions, timeout, workers, fast, timeoutBackend)
 
     if (numGames-numTraining) > 0:
         scores = [game.state.getScore() for game in games]
@@ -89,26 +89,30 @@ def breadthFirstSearch(problem):
 def genericDepthBreadthSearch(frontier, problem):
     # Implementations of stack and queue allow for this generic algorithm
 
-    # Keep track of visited states 
-    visitedStates = []
+    # Keep track of visited states, O(1) membership for hashable states
+    visitedStates = util.ClosedSet()
 
-    # frontier contains tuples of states and their path
-    frontier.push((problem.getStartState(), []))
+    # Nodes are stored once in a table of parent pointers; the path is
+    # rebuilt only when the goal is reached
+    nodes = util.NodeTable()
+
+    # frontier contains tuples of states and their node index
+    frontier.push((problem.getStartState(), nodes.add(util.NodeTable.ROOT, None)))
 
     # Continue iterating until queue empty
     while not frontier.isEmpty():
         # Pop the last member of the queue
-        state, path = frontier.pop()
+        state, node = frontier.pop()
  
         # Successfully found 
         if problem.isGoalState(state):
-            return path
+            return nodes.path(node)
         
         if state not in visitedStates:
-            visitedStates.append(state)
+            visitedStates.add(state)
             for successor in problem.getSuccessors(state):
-                # push each successor state with their updated path 
-                frontier.push(((successor[0], path + [successor[1]])))
+                # push each successor state with a node pointing back to its parent
+                frontier.push((successor[0], nodes.add(node, successor[1])))
 
     # Return none if there is no path to goal node
     return None
@@ -117,20 +121,21 @@ def uniformCostSearch(problem):
     """Search the node of least total cost first."""
     from util import PriorityQueue
 
-    visitedStates = []
+    visitedStates = util.ClosedSet()
+    nodes = util.NodeTable()
     pQueue = util.PriorityQueue()
-    pQueue.push((problem.getStartState(), [], 0), 0)
+    pQueue.push((problem.getStartState(), nodes.add(util.NodeTable.ROOT, None), 0), 0)
 
     while not pQueue.isEmpty():
-        state, path, cost = pQueue.pop()
+        state, node, cost = pQueue.pop()
 
         if problem.isGoalState(state):
-            return path
+            return nodes.path(node)
         if state not in visitedStates:
-            visitedStates.append(state)
+            visitedStates.add(state)
             for successor in problem.getSuccessors(state):
                 newCost = cost + successor[2]
-                pQueue.update((successor[0], path + [successor[1]], newCost), newCost)
+                pQueue.update((successor[0], nodes.add(node, successor[1]), newCost), newCost)
     return None
 
 def nullHeuristic(state, problem=None):
@@ -145,22 +150,23 @@ def aStarSearch(problem, heuristic=nullHeuristic):
     from util import PriorityQueue
 
     """Search the node that has the lowest combined cost and heuristic first."""
-    visitedStates = []
+    visitedStates = util.ClosedSet()
+    nodes = util.NodeTable()
     pQueue = util.PriorityQueue()
-    pQueue.push((problem.getStartState(), [], 0), heuristic(problem.getStartState(), problem))
+    pQueue.push((problem.getStartState(), nodes.add(util.NodeTable.ROOT, None), 0), heuristic(problem.getStartState(), problem))
 
     while not pQueue.isEmpty():
-        state, path, cost = pQueue.pop()
+        state, node, cost = pQueue.pop()
 
         if problem.isGoalState(state):
-            return path
+            return nodes.path(node)
         if state not in visitedStates:
-            visitedStates.append(state)
+            visitedStates.add(state)
             for successor in problem.getSuccessors(state):
                 newCost = cost + successor[2] 
                 # New priority is the cost + heuristic
                 newPriority = newCost + heuristic(successor[0], problem)
-                pQueue.update((successor[0], path + [successor[1]], newCost), newPriority)
+                pQueue.update((successor[0], nodes.add(node, successor[1]), newCost), newPriority)
     return None
 
 
@@ -29,6 +29,7 @@
 import sys
 import inspect
 import heapq, random
+import array
 
 
 class FixedRandom:
@@ -173,37 +174,91 @@ class PriorityQueue:
       has a priority associated with it and the client is usually interested
       in quick retrieval of the lowest-priority item in the queue. This
       data structure allows O(1) access to the lowest-priority item.
+
+      The live heap entries of each item are indexed by item so update() is
+      O(log n): a decrease-key marks the item's lowest entry as removed and
+      pushes a replacement, and pop() discards removed entries as they
+      surface.  An item pushed more than once has one live entry per push.
     """
+    REMOVED = object()
+
     def  __init__(self):
         self.heap = []
         self.count = 0
+        self.size = 0
+        self.entries = {}
 
     def push(self, item, priority):
-        entry = (priority, self.count, item)
+        entry = [priority, self.count, item]
         heapq.heappush(self.heap, entry)
         self.count += 1
+        self.size += 1
+        self._index(item, entry)
 
     def pop(self):
-        (_, _, item) = heapq.heappop(self.heap)
-        return item
+        while self.heap:
+            (_, _, item) = entry = heapq.heappop(self.heap)
+            if item is PriorityQueue.REMOVED:
+                continue
+            self.size -= 1
+            self._unindex(item, entry)
+            return item
+        raise IndexError('pop from an empty priority queue')
 
     def isEmpty(self):
-        return len(self.heap) == 0
+        return self.size == 0
 
     def update(self, item, priority):
-        # If item already in priority queue with higher priority, update its priority and rebuild the heap.
+        # If item already in priority queue with higher priority, update its priority.
         # If item already in priority queue with equal or lower priority, do nothing.
         # If item not in priority queue, do the same thing as self.push.
-        for index, (p, c, i) in enumerate(self.heap):
-            if i == item:
-                if p <= priority:
-                    break
-                del self.heap[index]
-                self.heap.append((priority, c, item))
-                heapq.heapify(self.heap)
-                break
-        else:
+        entry = self._find(item)
+        if entry is None:
             self.push(item, priority)
+            return
+        if entry[0] <= priority:
+            return
+        # Invalidate the old entry and push a replacement that keeps its
+        # insertion count, so ties are still broken in FIFO order
+        entry[2] = PriorityQueue.REMOVED
+        newEntry = [priority, entry[1], item]
+        heapq.heappush(self.heap, newEntry)
+        self._unindex(item, entry)
+        self._index(item, newEntry)
+
+    def _index(self, item, entry):
+        try:
+            self.entries.setdefault(item, []).append(entry)
+        except TypeError:
+            # Unhashable items are found by scanning the heap in _find
+            pass
+
+    def _unindex(self, item, entry):
+        try:
+            live = self.entries.get(item)
+        except TypeError:
+            return
+        for i in range(len(live)):
+            if live[i] is entry:
+                del live[i]
+                break
+        if not live:
+            del self.entries[item]
+
+    def _find(self, item):
+        """
+        Returns the live entry of item that would pop first, or None if item
+        is not in the queue.
+        """
+        try:
+            live = self.entries.get(item)
+        except TypeError:
+            live = [entry for entry in self.heap
+                    if entry[2] is not PriorityQueue.REMOVED and entry[2] == item]
+        if not live:
+            return None
+        # Insertion counts are unique, so items themselves are never compared
+        return min(live)
 
 class PriorityQueueWithFunction(PriorityQueue):
     """
@@ -221,6 +276,93 @@ class PriorityQueueWithFunction(PriorityQueue):
         "Adds an item to the queue with priority from the priority function"
         PriorityQueue.push(self, item, self.priorityFunction(item))
 
+class ClosedSet:
+    """
+    A container recording which search states have already been expanded.
+
+    Hashable states are kept in a set, so membership tests are O(1). States
+    that can't be hashed (e.g. a tuple holding a list, as in some
+    CornersProblem representations) are first frozen into nested tuples;
+    anything that still can't be hashed falls back to a list scan.
+    """
+    def __init__(self):
+        self.hashed = set()
+        self.unhashable = []
+
+    def add(self, state):
+        "Marks 'state' as expanded"
+        key = self._key(state)
+        if key is None:
+            self.unhashable.append(state)
+        else:
+            self.hashed.add(key)
+
+    def __contains__(self, state):
+        key = self._key(state)
+        if key is None:
+            return state in self.unhashable
+        return key in self.hashed
+
+    def __len__(self):
+        return len(self.hashed) + len(self.unhashable)
+
+    def _key(self, state):
+        try:
+            hash(state)
+            return state
+        except TypeError:
+            pass
+        try:
+            frozen = freeze(state)
+            hash(frozen)
+            return frozen
+        except TypeError:
+            return None
+
+class NodeTable:
+    """
+    Stores the nodes of a search tree as parallel arrays of parent indices
+    and actions, so frontier entries only carry an integer node index instead
+    of a copy of the whole action list. The action sequence leading to a node
+    is rebuilt once, by following parent pointers back to the root.
+    """
+    ROOT = -1
+
+    def __init__(self):
+        self.parents = array.array('l')
+        self.actions = []
+
+    def add(self, parent, action):
+        "Adds a child of node 'parent' reached by 'action'; returns its index"
+        self.parents.append(parent)
+        self.actions.append(action)
+        return len(self.actions) - 1
+
+    def path(self, node):
+        "Returns the list of actions leading from the root to 'node'"
+        path = []
+        while self.parents[node] != NodeTable.ROOT:
+            path.append(self.actions[node])
+            node = self.parents[node]
+        path.reverse()
+        return path
+
+    def __len__(self):
+        return len(self.actions)
+
+def freeze(obj):
+    """
+    Recursively converts lists, sets and dicts inside obj into tuples and
+    frozensets so the result can be used as a dictionary key.
+    """
+    if isinstance(obj, (list, tuple)):
+        return tuple([freeze(x) for x in obj])
+    if isinstance(obj, (set, frozenset)):
+        return frozenset([freeze(x) for x in obj])
+    if isinstance(obj, dict):
+        return frozenset([(k, freeze(v)) for k, v in obj.items()])
+    return obj
+
 
 def manhattanDistance( xy1, xy2 ):
     "Returns the Manhattan distance between points xy1 and xy2"
@@ -276,6 +418,19 @@ class Counter(dict):
         self.setdefault(idx, 0)
         return dict.__getitem__(self, idx)
 
+    def peek(self, idx, default=0):
+        """
+        Returns the count of idx, or default if it has none, without adding
+        idx to the counter as reading it with [] does.
+
+        >>> a = Counter()
+        >>> a.peek('test')
+        0
+        >>> 'test' in a
+        False
+        """
+        return dict.get(self, idx, default)
+
     def incrementAll(self, keys, count):
         """
         Increments all elements of keys by the same count.
@@ -605,7 +760,9 @@ def pause():
 # of active time outs.  Currently, questions which have test cases calling
 # this have all student code so wrapped.
 #
+import os
 import signal
+import threading
 import time
 class TimeoutFunctionException(Exception):
     """Exception to raise on a timeout"""
@@ -641,6 +798,120 @@ class TimeoutFunction:
         return result
 
 
+def raiseInThread(threadId, exception):
+    """
+    Asks the interpreter to raise exception in the thread threadId the next
+    time it runs Python code, or cancels a pending request when exception is
+    None.
+    """
+    import ctypes
+    if exception is not None:
+        exception = ctypes.py_object(exception)
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(threadId), exception)
+
+
+class Watchdog:
+    """
+    A background thread holding the deadlines of every WatchdogTimeoutFunction
+    call in the process.  When a deadline passes it raises
+    TimeoutFunctionException in the thread making that call.  The exception
+    is delivered the next time the thread runs Python code, so a call blocked
+    inside C code is only stopped once it returns.
+    """
+
+    def __init__(self):
+        self.start()
+
+    def start(self):
+        # Also called in a child process after a fork, where the thread of
+        # the parent does not exist and its lock may have been held.
+        self.pid = os.getpid()
+        self.condition = threading.Condition()
+        self.deadlines = []
+        self.armed = {}
+        self.serial = 0
+        thread = threading.Thread(target=self.run, name='Watchdog')
+        thread.daemon = True
+        thread.start()
+
+    def arm(self, timeout):
+        """
+        Starts timing a call from the current thread, returning a serial
+        number to pass to disarm.
+        """
+        if self.pid != os.getpid():
+            self.start()
+        with self.condition:
+            self.serial += 1
+            entry = (time.monotonic() + timeout, self.serial)
+            heapq.heappush(self.deadlines, entry)
+            self.armed[self.serial] = threading.get_ident()
+            if self.deadlines[0] == entry:
+                self.condition.notify()
+            return self.serial
+
+    def disarm(self, serial):
+        """
+        Stops timing a call, returning True if its deadline had already
+        passed.  Any exception raised for it that has not been delivered yet
+        is cancelled, so it cannot escape once the call is over.
+        """
+        with self.condition:
+            if self.armed.pop(serial, None) is not None:
+                return False
+            raiseInThread(threading.get_ident(), None)
+            return True
+
+    def run(self):
+        with self.condition:
+            while True:
+                while self.deadlines and self.deadlines[0][1] not in self.armed:
+                    heapq.heappop(self.deadlines)
+                if not self.deadlines:
+                    self.condition.wait()
+                    continue
+                deadline, serial = self.deadlines[0]
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self.condition.wait(remaining)
+                    continue
+                heapq.heappop(self.deadlines)
+                raiseInThread(self.armed.pop(serial), TimeoutFunctionException)
+
+
+_WATCHDOG = None
+_WATCHDOG_LOCK = threading.Lock()
+
+
+class WatchdogTimeoutFunction:
+    """
+    Like TimeoutFunction, but enforced by a shared watchdog thread instead of
+    SIGALRM.  The timeout may be a fraction of a second, nothing is installed
+    or removed around each call, and the function may be called from any
+    thread, so timed games can be run concurrently.
+    """
+
+    def __init__(self, function, timeout):
+        self.timeout = timeout
+        self.function = function
+
+    def __call__(self, *args, **keyArgs):
+        global _WATCHDOG
+        if self.timeout <= 0:
+            raise TimeoutFunctionException()
+        with _WATCHDOG_LOCK:
+            if _WATCHDOG is None:
+                _WATCHDOG = Watchdog()
+            watchdog = _WATCHDOG
+        serial = watchdog.arm(self.timeout)
+        try:
+            result = self.function(*args, **keyArgs)
+        finally:
+            if watchdog.disarm(serial):
+                raise TimeoutFunctionException()
+        return result
+
+
 
 _ORIGINAL_STDOUT = None
 _ORIGINAL_STDERR = None
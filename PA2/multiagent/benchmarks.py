@@ -0,0 +1,155 @@
+# benchmarks.py
+# -------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+# 
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Micro-benchmarks for the parts of the game engine that adversarial search
+agents spend their time in.  Run, for example:
+
+> python benchmarks.py -b successors -l mediumClassic -d 3
+"""
+
+import sys
+import time
+import tracemalloc
+
+import layout
+from game import Actions
+from pacman import GameState
+from pacman import GhostRules
+from pacman import PacmanRules
+
+def initialState(layoutName):
+    lay = layout.getLayout(layoutName)
+    if lay == None:
+        raise Exception("The layout " + layoutName + " cannot be found")
+    state = GameState()
+    state.initialize(lay, lay.getNumGhosts())
+    return state
+
+def expandTree(state, depth, keep):
+    """
+    Generates every successor of 'state' down to 'depth' plies, where a ply
+    is one move by every agent, appending the states to 'keep'.
+    """
+    numAgents = state.getNumAgents()
+    frontier = [state]
+    for ply in range(depth * numAgents):
+        agentIndex = ply % numAgents
+        nextFrontier = []
+        for parent in frontier:
+            for action in parent.getLegalActions(agentIndex):
+                successor = parent.generateSuccessor(agentIndex, action)
+                keep.append(successor)
+                if not successor.isWin() and not successor.isLose():
+                    nextFrontier.append(successor)
+        frontier = nextFrontier
+    return keep
+
+def benchmarkSuccessors(layoutName, depth):
+    """
+    Reports the time and the memory retained per generateSuccessor call when
+    expanding the full game tree of 'layoutName' to 'depth'.
+    """
+    state = initialState(layoutName)
+
+    GameState.getAndResetExplored()
+    start = time.time()
+    successors = expandTree(state, depth, [])
+    elapsed = time.time() - start
+    GameState.getAndResetExplored()
+    count = len(successors)
+    successors = None
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    successors = expandTree(state, depth, [])
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    GameState.getAndResetExplored()
+
+    print('Layout:             %s (depth %d)' % (layoutName, depth))
+    print('Successors:         %d' % count)
+    print('Time per successor: %.2f us' % (elapsed * 1e6 / count))
+    print('Bytes per successor: %d' % (retained // count))
+
+def wallTestedLegalActions(state, agentIndex):
+    """
+    The legal actions of an agent worked out by testing the walls around it,
+    as the rules did before layouts kept a LegalMoves table.
+    """
+    walls = state.data.layout.walls
+    conf = state.data.agentStates[agentIndex].configuration
+    possible = Actions.getPossibleActions(conf, walls)
+    if agentIndex == 0:
+        return possible
+    if 'Stop' in possible:
+        possible.remove('Stop')
+    reverse = Actions.reverseDirection(conf.direction)
+    if reverse in possible and len(possible) > 1:
+        possible.remove(reverse)
+    return possible
+
+def tableLegalActions(state, agentIndex):
+    if agentIndex == 0:
+        return PacmanRules.getLegalActions(state)
+    return GhostRules.getLegalActions(state, agentIndex)
+
+def benchmarkLegalActions(layoutName, depth):
+    """
+    Reports legal action calls per second, with and without the layout's
+    LegalMoves table, over every agent in the states of the game tree of
+    'layoutName' expanded to 'depth'.
+    """
+    state = initialState(layoutName)
+    states = expandTree(state, depth, [state])
+    GameState.getAndResetExplored()
+    numAgents = state.getNumAgents()
+    calls = [(s, agentIndex) for s in states for agentIndex in range(numAgents)]
+    for s, agentIndex in calls:
+        if wallTestedLegalActions(s, agentIndex) != tableLegalActions(s, agentIndex):
+            raise Exception('Legal move table disagrees with the walls')
+
+    print('Layout:             %s (depth %d)' % (layoutName, depth))
+    print('Calls:              %d' % len(calls))
+    for name, legalActions in [('Wall tests', wallTestedLegalActions),
+                               ('Legal move table', tableLegalActions)]:
+        start = time.time()
+        for repeat in range(10):
+            for s, agentIndex in calls:
+                legalActions(s, agentIndex)
+        elapsed = time.time() - start
+        print('%-19s %.0f calls/s' % (name + ':', 10 * len(calls) / elapsed))
+
+BENCHMARKS = {'successors': benchmarkSuccessors,
+              'legal': benchmarkLegalActions}
+
+def readCommand(argv):
+    from optparse import OptionParser
+    parser = OptionParser('USAGE: python benchmarks.py <options>')
+    parser.add_option('-b', '--benchmark', dest='benchmark', default='successors',
+                      help='one of: ' + ', '.join(sorted(BENCHMARKS.keys())) + ' [Default: %default]')
+    parser.add_option('-l', '--layout', dest='layout', default='mediumClassic',
+                      help='the layout to benchmark on [Default: %default]')
+    parser.add_option('-d', '--depth', dest='depth', type='int', default=3,
+                      help='search depth in plies [Default: %default]')
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    if options.benchmark not in BENCHMARKS:
+        raise Exception('Unknown benchmark ' + options.benchmark)
+    return options
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    BENCHMARKS[options.benchmark](options.layout, options.depth)
@@ -14,7 +14,10 @@
 
 from util import manhattanDistance
 from game import Directions
-import random, util
+import random, util, time
+import multiprocessing
+import pickle
+import weakref
 
 from game import Agent
 
@@ -116,10 +119,249 @@ class MultiAgentSearchAgent(Agent):
     is another abstract class.
     """
 
-    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2'):
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', tt = '0', ttSize = '100000', timeLimit = '0', workers = '1', verbose = '0'):
         self.index = 0 # Pacman is always agent index 0
         self.evaluationFunction = util.lookup(evalFn, globals())
         self.depth = int(depth)
+        # Optional transposition table, enabled with -a tt=1
+        self.transpositions = None
+        if int(tt):
+            self.transpositions = TranspositionTable(int(ttSize))
+        # Seconds per move for anytime search, enabled with -a timeLimit=0.5;
+        # depth is then ignored
+        self.timeLimit = float(timeLimit)
+        self.deadline = None
+        self.reachedCutoff = False
+        self.principalAction = None
+        self.completedDepth = 0
+        # Worker processes for root-split search, enabled with -a workers=4;
+        # the pool is started on the first move and closed in final, or
+        # when the agent is freed or the program exits without calling final
+        self.workers = int(workers)
+        self.pool = None
+        self.poolFinalizer = None
+        # Statistics are printed at the end of each game with -a verbose=1
+        self.verbose = int(verbose)
+
+    def __getstate__(self):
+        # Worker processes get a copy of the agent, but not of its pool
+        state = self.__dict__.copy()
+        state['pool'] = None
+        state['poolFinalizer'] = None
+        return state
+
+    def splitsRoot(self):
+        """
+        Whether moves are searched with parallelRootSearch.  The processes of
+        a pool are daemonic and may not start pools of their own, so agents
+        playing in pacman.py --workers processes search serially instead.
+        """
+        return self.workers > 1 and not multiprocessing.current_process().daemon
+
+    def rootChildValue(self, successor):
+        """
+        Returns the search value of successor, a state reached by one of
+        Pacman's root actions.  Subclasses override this to support
+        parallelRootSearch.
+        """
+        util.raiseNotDefined()
+
+    def parallelRootSearch(self, gameState):
+        """
+        Root-split search: the subtrees under Pacman's root actions are
+        searched concurrently by self.workers processes.  gameState is pickled
+        once and sent to every worker, which searches the child for one action
+        with rootChildValue.  As in the serial search, the first action with
+        the highest value is returned.
+        """
+        if self.pool is None:
+            # The agent goes to the workers pickled, so that the pool does
+            # not keep it alive
+            agentBytes = pickle.dumps(self, pickle.HIGHEST_PROTOCOL)
+            self.pool = multiprocessing.Pool(self.workers, initRootWorker, (agentBytes,))
+            self.poolFinalizer = weakref.finalize(self, shutDownPool, self.pool)
+        stateBytes = pickle.dumps(gameState, pickle.HIGHEST_PROTOCOL)
+        actions = gameState.getLegalActions(self.index)
+        values = self.pool.map(searchRootChild, [(stateBytes, action) for action in actions])
+        max_value = float("-inf")
+        best_action = Directions.STOP
+        for action, value in zip(actions, values):
+            if value > max_value:
+                max_value = value
+                best_action = action
+        return best_action
+
+    def closePool(self):
+        if self.pool is not None:
+            self.poolFinalizer()
+            self.pool = None
+            self.poolFinalizer = None
+
+    def iterativeDeepening(self, gameState, search):
+        """
+        Anytime search: calls search(gameState) with self.depth set to 1, 2, ...
+        until self.timeLimit seconds have passed, and returns the action of the
+        deepest search that completed.  The best root action of each
+        iteration is searched first in the next one.  Deepening stops early
+        once a search reaches no depth cutoff, since deeper searches would
+        see the same tree.
+        """
+        fixedDepth = self.depth
+        self.deadline = time.time() + self.timeLimit
+        self.principalAction = None
+        self.completedDepth = 0
+        bestAction = None
+        try:
+            depth = 1
+            while True:
+                self.depth = depth
+                self.reachedCutoff = False
+                bestAction = self.principalAction = search(gameState)
+                self.completedDepth = depth
+                if not self.reachedCutoff:
+                    break
+                depth += 1
+        except SearchTimeout:
+            pass
+        finally:
+            self.depth = fixedDepth
+            self.deadline = None
+        if bestAction is None:
+            # Not even a depth 1 search finished in time
+            bestAction = gameState.getLegalActions(self.index)[0]
+        return bestAction
+
+    def isCutoff(self, gameState, depth):
+        """
+        Returns True if the search should stop at gameState and fall back on
+        the evaluation function.  Raises SearchTimeout once an anytime
+        search is out of time.
+        """
+        if self.deadline is not None and time.time() > self.deadline:
+            raise SearchTimeout()
+        if depth == self.depth:
+            self.reachedCutoff = True
+            return True
+        return gameState.isWin() or gameState.isLose()
+
+    def orderRootActions(self, actions):
+        """
+        Moves the best action of the previous iterative deepening pass to
+        the front of actions.
+        """
+        if self.principalAction in actions:
+            actions = [self.principalAction] + [a for a in actions if a != self.principalAction]
+        return actions
+
+    def newSearch(self):
+        """
+        Called at the start of each getAction, so that transposition table
+        entries from earlier moves are replaced first.
+        """
+        if self.transpositions is not None:
+            self.transpositions.newSearch()
+
+    def lookupTransposition(self, gameState, depth, agentNum):
+        """
+        Returns the value stored for gameState searched from this depth by
+        agentNum, or None if the transposition table is off or has no entry.
+        """
+        if self.transpositions is None:
+            return None
+        value = self.transpositions.lookup(gameState, self.depth - depth, agentNum)
+        if value is not None:
+            # The stored subtree may have been cut off by depth
+            self.reachedCutoff = True
+        return value
+
+    def storeTransposition(self, gameState, depth, agentNum, value):
+        """
+        Records value in the transposition table (if enabled) and returns it.
+        """
+        if self.transpositions is not None:
+            self.transpositions.store(gameState, self.depth - depth, agentNum, value)
+        return value
+
+    def final(self, state):
+        self.closePool()
+        if self.verbose and self.transpositions is not None:
+            print('Transposition table: %s' % self.transpositions.report())
+
+# The copy of the search agent used by each root-split worker process
+rootWorkerAgent = None
+
+def shutDownPool(pool):
+    pool.close()
+    pool.join()
+
+def initRootWorker(agentBytes):
+    global rootWorkerAgent
+    rootWorkerAgent = pickle.loads(agentBytes)
+
+def searchRootChild(task):
+    """Worker side of parallelRootSearch: returns the value of one root action"""
+    stateBytes, action = task
+    gameState = pickle.loads(stateBytes)
+    rootWorkerAgent.newSearch()
+    successor = gameState.generateSuccessor(rootWorkerAgent.index, action)
+    return rootWorkerAgent.rootChildValue(successor)
+
+class SearchTimeout(Exception):
+    """Raised inside an anytime search when the time budget for a move is spent"""
+    pass
+
+class TranspositionTable:
+    """
+    A fixed-size table of search values keyed by (state hash, depth
+    remaining, agent index), so positions reached through different move
+    orders are only searched once.
+
+    Each key maps to a single slot.  When two keys share a slot, the stored
+    entry is kept only if it comes from the current search and was searched
+    deeper than the new one (depth-preferred replacement); otherwise the new
+    entry replaces it.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.slots = [None] * size
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.replacements = 0
+
+    def newSearch(self):
+        self.generation += 1
+
+    def lookup(self, state, depthRemaining, agentIndex):
+        key = (hash(state), depthRemaining, agentIndex)
+        entry = self.slots[hash(key) % self.size]
+        # Compare the states too, so a hash collision can't return a wrong value
+        if entry is not None and entry[0] == key and entry[1] == state:
+            self.hits += 1
+            return entry[2]
+        self.misses += 1
+        return None
+
+    def store(self, state, depthRemaining, agentIndex, value):
+        key = (hash(state), depthRemaining, agentIndex)
+        index = hash(key) % self.size
+        entry = self.slots[index]
+        if entry is not None and entry[0] != key:
+            if entry[3] == self.generation and entry[0][1] > depthRemaining:
+                return
+            self.replacements += 1
+        self.slots[index] = (key, state, value, self.generation)
+        self.stores += 1
+
+    def report(self):
+        lookups = self.hits + self.misses
+        hitRate = 0.0
+        if lookups > 0:
+            hitRate = float(self.hits) / lookups
+        return 'hits %d, misses %d (hit rate %.2f), stores %d, replacements %d' % (
+            self.hits, self.misses, hitRate, self.stores, self.replacements)
 
 class MinimaxAgent(MultiAgentSearchAgent):
     """
@@ -149,10 +391,18 @@ class MinimaxAgent(MultiAgentSearchAgent):
         gameState.isLose():
         Returns whether or not the game state is a losing state
         """
+        self.newSearch()
         # Enter minimax with the depth and agentNum set to 0
         # turn = True indicates it's pacman's turn (agent = 0)
+        if self.timeLimit > 0:
+            return self.iterativeDeepening(gameState, lambda state: self.minimax(state, 0, 0, True))
+        if self.splitsRoot():
+            return self.parallelRootSearch(gameState)
         return self.minimax(gameState, 0, 0, True)
 
+    def rootChildValue(self, successor):
+        return self.minimax(successor, 0, self.index + 1, False)
+
     def minimax(self, gameState, depth, agentNum, turn):
         """Minimax search implementation
 
@@ -166,15 +416,24 @@ class MinimaxAgent(MultiAgentSearchAgent):
             Direction: Returns the move that is best given the minimax function
         """
         # Terminal state, return evaluation
-        if depth == self.depth or gameState.isWin() or gameState.isLose():
+        if self.isCutoff(gameState, depth):
             return self.evaluationFunction(gameState)
 
+        # Reuse the value of a position already searched to the same depth,
+        # except at the root where the action is needed
+        if not (turn and depth == 0):
+            cached = self.lookupTransposition(gameState, depth, agentNum)
+            if cached is not None:
+                return cached
+
         # Pacman turn, agentNum = 0
         if turn:
             # Initialize max_value as -inf, and default action as stop
             max_value = float("-inf")
             best_action = Directions.STOP
             actions = gameState.getLegalActions(agentNum)
+            if depth == 0:
+                actions = self.orderRootActions(actions)
             for action in actions:
                 successor = gameState.generateSuccessor(agentNum, action)
                 # Don't increment depth initially, swap to min, with agentNum set to 1
@@ -188,7 +447,7 @@ class MinimaxAgent(MultiAgentSearchAgent):
                 return best_action
             else:
                 # Return value otherwise
-                return max_value
+                return self.storeTransposition(gameState, depth, agentNum, max_value)
 
         # Agent turn
         else:
@@ -207,7 +466,7 @@ class MinimaxAgent(MultiAgentSearchAgent):
                     successor = gameState.generateSuccessor(agentNum, action)
                     # Stay in min, don't increment depth since we're still on the same layer
                     min_value = min(min_value, self.minimax(successor, depth, agentNum + 1, False))
-            return min_value
+            return self.storeTransposition(gameState, depth, agentNum, min_value)
 
 class AlphaBetaAgent(MultiAgentSearchAgent):
     """
@@ -233,19 +492,36 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
         All ghosts should be modeled as choosing uniformly at random from their
         legal moves.
         """
+        self.newSearch()
+        if self.timeLimit > 0:
+            return self.iterativeDeepening(gameState, lambda state: self.expectimax(state, 0, 0, True))
+        if self.splitsRoot():
+            return self.parallelRootSearch(gameState)
         return self.expectimax(gameState, 0, 0, True)
 
+    def rootChildValue(self, successor):
+        return self.expectimax(successor, 0, self.index + 1, False)
+
     def expectimax(self, gameState, depth, agentNum, turn):
         # Terminal state, return evaluation
-        if depth == self.depth or gameState.isWin() or gameState.isLose():
+        if self.isCutoff(gameState, depth):
             return self.evaluationFunction(gameState)
 
+        # Reuse the value of a position already searched to the same depth,
+        # except at the root where the action is needed
+        if not (turn and depth == 0):
+            cached = self.lookupTransposition(gameState, depth, agentNum)
+            if cached is not None:
+                return cached
+
         # Pacman turn, agentNum = 0
         if turn:
             # Initialize max_value as -inf, and best action as stop
             max_value = float("-inf")
             best_action = Directions.STOP
             actions = gameState.getLegalActions(agentNum)
+            if depth == 0:
+                actions = self.orderRootActions(actions)
             for action in actions:
                 # Generate each successor 
                 successor = gameState.generateSuccessor(agentNum, action)
@@ -259,7 +535,7 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
                 return best_action
             # Return value otherwise
             else:
-                return max_value
+                return self.storeTransposition(gameState, depth, agentNum, max_value)
 
         # Agent turn
         else:
@@ -278,7 +554,7 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
                     # Add elements to the list
                     values += [self.expectimax(successor, depth, agentNum + 1, False)]
             # Return the average of the list
-            return sum(values) / len(values)
+            return self.storeTransposition(gameState, depth, agentNum, sum(values) / len(values))
 
 def betterEvaluationFunction(currentGameState):
     """
@@ -0,0 +1,185 @@
+# benchmarks.py
+# -------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Micro-benchmarks for the Counter arithmetic that approximate Q-learning
+agents spend their time in.  Run, for example:
+
+> python benchmarks.py -b counter -l mediumGrid -e SimpleExtractor
+"""
+
+import random
+import sys
+import time
+
+import layout
+import util
+from featureExtractors import IdentityExtractor
+from featureExtractors import SimpleExtractor
+from pacman import GameState
+
+EXTRACTORS = {'IdentityExtractor': IdentityExtractor,
+              'SimpleExtractor': SimpleExtractor}
+
+def playedStates(layoutName, count):
+    """
+    The first 'count' states Pacman is in over random games on 'layoutName',
+    with the ghosts moving at random as well.
+    """
+    lay = layout.getLayout(layoutName)
+    if lay == None:
+        raise Exception("The layout " + layoutName + " cannot be found")
+    random.seed(0)
+    states = []
+    while len(states) < count:
+        state = GameState()
+        state.initialize(lay, lay.getNumGhosts())
+        while not state.isWin() and not state.isLose() and len(states) < count:
+            states.append(state)
+            for agentIndex in range(state.getNumAgents()):
+                action = random.choice(state.getLegalActions(agentIndex))
+                state = state.generateSuccessor(agentIndex, action)
+                if state.isWin() or state.isLose():
+                    break
+    return states
+
+def counterUpdates(featureLists, alpha):
+    """
+    The weight updates of approximate Q-learning with util.Counter: each
+    state's actions are scored, the best is taken, and the weights move
+    towards a target of 1 along its features.  Returns the weights and
+    the normalized Q-values of the last state.
+    """
+    weights = util.Counter()
+    for actionFeatures in featureLists:
+        qValues = util.Counter()
+        for action, features in actionFeatures:
+            qValues[action] = weights * features
+        best = qValues.argMax()
+        difference = 1 - qValues[best]
+        for feature, value in dict(actionFeatures)[best].items():
+            weights[feature] += alpha * difference * value
+        qValues.normalize()
+    return weights, qValues
+
+def denseUpdates(featureLists, alpha):
+    "The same updates as counterUpdates, with util.DenseCounter."
+    space = util.KeySpace()
+    actionSpace = util.KeySpace()
+    for action in sorted(set([action for actionFeatures in featureLists
+                              for action, features in actionFeatures])):
+        actionSpace.intern(action)
+    denseLists = [[(action, util.DenseCounter(space, features))
+                   for action, features in actionFeatures]
+                  for actionFeatures in featureLists]
+    start = time.time()
+    weights = util.DenseCounter(space)
+    for actionFeatures in denseLists:
+        qValues = util.DenseCounter(actionSpace)
+        for action, features in actionFeatures:
+            qValues[action] = weights * features
+        best = qValues.argMax()
+        difference = 1 - qValues[best]
+        weights = weights.combine(dict(actionFeatures)[best], alpha * difference)
+        qValues.normalize()
+    return weights, qValues, time.time() - start
+
+def benchmarkCounter(layoutName, extractorName, count):
+    """
+    Reports the time per state of scoring, updating and normalizing with
+    util.Counter and util.DenseCounter over the features 'extractorName'
+    gives for 'count' states played on 'layoutName', taking the best of
+    three runs, and then the time of arithmetic on the whole learned weight
+    vectors.  Actions are scored in sorted order so that both break ties
+    between Q-values alike, and dense feature vectors are built before
+    timing, as an agent would when it first sees them.
+
+    DenseCounter only pays off on arithmetic between long vectors.  The
+    per-state updates, which touch a few sparse features, arithmetic on
+    vectors of a handful of keys, and argMax without numpy can be slower
+    than with Counter, and the report lists the measurements where it was.
+    """
+    extractor = EXTRACTORS[extractorName]()
+    featureLists = []
+    for state in playedStates(layoutName, count):
+        features = extractor.getFeaturesForAllActions(state)
+        featureLists.append(sorted(features.items()))
+
+    counterTime = denseTime = float('inf')
+    for repeat in range(3):
+        start = time.time()
+        weights, qValues = counterUpdates(featureLists, 0.01)
+        counterTime = min(counterTime, time.time() - start)
+        denseWeights, denseQValues, elapsed = denseUpdates(featureLists, 0.01)
+        denseTime = min(denseTime, elapsed)
+    for key in set(weights.keys()) | set(denseWeights.keys()):
+        if abs(weights[key] - denseWeights[key]) > 1e-9:
+            raise Exception('DenseCounter weights disagree with Counter')
+    if qValues.argMax() != denseQValues.argMax():
+        raise Exception('DenseCounter Q-values disagree with Counter')
+
+    print('Layout:             %s (%d states)' % (layoutName, count))
+    print('Extractor:          %s (%d features)' % (extractorName, len(weights)))
+    print('Numpy:              %s' % ('yes' if util._NUMPY_ENABLED else 'no'))
+    for name, elapsed in [('Counter', counterTime), ('DenseCounter', denseTime)]:
+        print('%-19s %.2f us per state' % (name + ':', elapsed * 1e6 / count))
+    slower = []
+    if denseTime > counterTime:
+        slower.append('per state')
+
+    print('Whole weight vector (Counter / DenseCounter, speedup):')
+    otherWeights = weights.copy()
+    otherDenseWeights = denseWeights.copy()
+    for name, counterOp, denseOp in [
+            ('dot', lambda: weights * otherWeights, lambda: denseWeights * otherDenseWeights),
+            ('add', lambda: weights + otherWeights, lambda: denseWeights + otherDenseWeights),
+            ('argMax', weights.argMax, denseWeights.argMax),
+            ('normalize', lambda: weights.copy().normalize(), lambda: denseWeights.copy().normalize())]:
+        times = []
+        for op in [counterOp, denseOp]:
+            start = time.time()
+            for repeat in range(100):
+                op()
+            times.append((time.time() - start) * 1e4)
+        print('  %-17s %.2f / %.2f us, %.1fx' % (name + ':', times[0], times[1], times[0] / times[1]))
+        if times[1] > times[0]:
+            slower.append(name)
+    if slower:
+        print('DenseCounter is slower than Counter here for: %s' % ', '.join(slower))
+
+BENCHMARKS = {'counter': benchmarkCounter}
+
+def readCommand(argv):
+    from optparse import OptionParser
+    parser = OptionParser('USAGE: python benchmarks.py <options>')
+    parser.add_option('-b', '--benchmark', dest='benchmark', default='counter',
+                      help='one of: ' + ', '.join(sorted(BENCHMARKS.keys())) + ' [Default: %default]')
+    parser.add_option('-l', '--layout', dest='layout', default='mediumGrid',
+                      help='the layout to benchmark on [Default: %default]')
+    parser.add_option('-e', '--extractor', dest='extractor', default='SimpleExtractor',
+                      help='one of: ' + ', '.join(sorted(EXTRACTORS.keys())) + ' [Default: %default]')
+    parser.add_option('-n', '--states', dest='states', type='int', default=2000,
+                      help='number of played states to use [Default: %default]')
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    if options.benchmark not in BENCHMARKS:
+        raise Exception('Unknown benchmark ' + options.benchmark)
+    if options.extractor not in EXTRACTORS:
+        raise Exception('Unknown extractor ' + options.extractor)
+    return options
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    BENCHMARKS[options.benchmark](options.layout, options.extractor, options.states)
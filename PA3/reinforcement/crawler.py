@@ -260,6 +260,7 @@ class CrawlingRobot:
         raise Exception('Never Should See This!')
 
     def draw(self, stepCount, stepDelay):
+        if self.canvas is None: return
         x1, y1 = self.getRobotPosition()
         x1 = x1 % self.totWidth
 
@@ -331,7 +332,7 @@ class CrawlingRobot:
         self.lastStep = stepCount
 #        self.lastVel = velocity
 
-    def __init__(self, canvas):
+    def __init__(self, canvas=None):
 
         ## Canvas ##
         self.canvas = canvas
@@ -352,33 +353,90 @@ class CrawlingRobot:
         self.minHandAngle = -(5.0/6.0) * PI
 
         ## Draw Ground ##
-        self.totWidth = canvas.winfo_reqwidth()
-        self.totHeight = canvas.winfo_reqheight()
+        ## Without a canvas the robot runs headless, using the
+        ## dimensions of the GUI canvas
+        if canvas is None:
+            self.totWidth, self.totHeight = 1000, 200
+        else:
+            self.totWidth = canvas.winfo_reqwidth()
+            self.totHeight = canvas.winfo_reqheight()
         self.groundHeight = 40
         self.groundY = self.totHeight - self.groundHeight
 
-        self.ground = canvas.create_rectangle(0,
-            self.groundY,self.totWidth,self.totHeight, fill='blue')
-
         ## Robot Body ##
         self.robotWidth = 80
         self.robotHeight = 40
         self.robotPos = (20, self.groundY)
-        self.robotBody = canvas.create_polygon(0,0,0,0,0,0,0,0, fill='green')
 
         ## Robot Arm ##
         self.armLength = 60
-        self.robotArm = canvas.create_line(0,0,0,0,fill='orange',width=5)
 
         ## Robot Hand ##
         self.handLength = 40
-        self.robotHand = canvas.create_line(0,0,0,0,fill='red',width=3)
+
+        if canvas is not None:
+            self.ground = canvas.create_rectangle(0,
+                self.groundY,self.totWidth,self.totHeight, fill='blue')
+            self.robotBody = canvas.create_polygon(0,0,0,0,0,0,0,0, fill='green')
+            self.robotArm = canvas.create_line(0,0,0,0,fill='orange',width=5)
+            self.robotHand = canvas.create_line(0,0,0,0,fill='red',width=3)
 
         self.positions = [0,0]
   #      self.angleSums = [0,0]
 
 
+def makeHeadlessEnvironments(count):
+    """
+      Builds 'count' independent crawler environments, each driving
+      its own robot without a canvas, for use with
+      environment.runBatchedSteps.
+    """
+    return [CrawlingRobotEnvironment(CrawlingRobot()) for i in range(count)]
+
+
+def runHeadless(envs, steps, epsilon, alpha, discount):
+    """
+      Trains one Q-learning agent on 'envs' headless crawlers stepped
+      'steps' times each in lockstep, and reports the average velocity
+      of each crawler.  The command line defaults for the rates are the
+      ones the GUI starts with.
+    """
+    import qlearningAgents
+    environments = makeHeadlessEnvironments(envs)
+    actionFn = lambda state: environments[0].getPossibleActions(state)
+    learner = qlearningAgents.QLearningAgent(actionFn=actionFn, epsilon=epsilon,
+                                             alpha=alpha, gamma=discount)
+    start = time.time()
+    totals = environment.runBatchedSteps(learner, environments, steps)
+    elapsed = time.time() - start
+    print('Trained on %d crawlers for %d steps each in %.2f seconds' % (envs, steps, elapsed))
+    print('Q-table size: %d entries' % learner.getTableSize())
+    for i, total in enumerate(totals):
+        print('Crawler %d: average velocity %.3f' % (i, total / steps))
+    return learner
+
 
 if __name__ == '__main__':
-    from graphicsCrawlerDisplay import *
-    run()
+    from optparse import OptionParser
+    parser = OptionParser('USAGE: python crawler.py [--headless <options>]')
+    parser.add_option('--headless', action='store_true', dest='headless', default=False,
+                      help='Train without the GUI, on several crawlers at once')
+    parser.add_option('--envs', type='int', dest='envs', default=4,
+                      help='Number of crawlers to train on with --headless (default %default)')
+    parser.add_option('-s', '--steps', type='int', dest='steps', default=5000,
+                      help='Steps per crawler with --headless (default %default)')
+    parser.add_option('-e', '--epsilon', type='float', dest='epsilon', default=0.5,
+                      help='Chance of taking a random action (default %default)')
+    parser.add_option('-l', '--learningRate', type='float', dest='alpha', default=0.88,
+                      help='TD learning rate (default %default)')
+    parser.add_option('-d', '--discount', type='float', dest='discount', default=0.88,
+                      help='Discount on future (default %default)')
+    options, otherjunk = parser.parse_args()
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    if options.headless:
+        runHeadless(options.envs, options.steps, options.epsilon,
+                    options.alpha, options.discount)
+    else:
+        from graphicsCrawlerDisplay import *
+        run()
@@ -54,3 +54,87 @@ class Environment:
         state = self.getCurrentState()
         actions = self.getPossibleActions(state)
         return len(actions) == 0
+
+
+def runBatchedEpisodes(agent, environments, discount, episodes, decision=None):
+    """
+      Runs 'episodes' episodes spread over several independent
+      environments that are stepped in lockstep and all feed the
+      same agent.  Whenever an environment finishes an episode it is
+      reset and starts the next one until the budget is used up.
+
+      Nothing is displayed or printed; the agent hooks are resolved
+      once up front rather than on every step.
+
+      Returns the list of discounted episode returns in the order
+      the episodes finished.
+    """
+    if decision is None: decision = agent.getAction
+    startEpisode = getattr(agent, 'startEpisode', None)
+    observeTransition = getattr(agent, 'observeTransition', None)
+
+    returns = []
+    live = []
+    for environment in environments[:episodes]:
+        environment.reset()
+        if startEpisode is not None: startEpisode()
+        live.append([environment, 0, 1.0])
+    started = len(live)
+
+    while live:
+        running = []
+        for slot in live:
+            environment = slot[0]
+            state = environment.getCurrentState()
+            if len(environment.getPossibleActions(state)) == 0:
+                returns.append(slot[1])
+                if started == episodes: continue
+                started += 1
+                environment.reset()
+                if startEpisode is not None: startEpisode()
+                slot[1], slot[2] = 0, 1.0
+                running.append(slot)
+                continue
+
+            action = decision(state)
+            if action == None:
+                raise Exception('Error: Agent returned None action')
+            nextState, reward = environment.doAction(action)
+            if observeTransition is not None:
+                observeTransition(state, action, nextState, reward)
+            slot[1] += reward * slot[2]
+            slot[2] *= discount
+            running.append(slot)
+        live = running
+    return returns
+
+def runBatchedSteps(agent, environments, steps, decision=None):
+    """
+      Advances every environment 'steps' times in lockstep, feeding
+      all transitions to the same agent.  Meant for continuing tasks
+      such as the crawler that never reach a terminal state; an
+      environment that does run out of actions is simply reset.
+
+      The whole run counts as a single episode for the agent, as in
+      the crawler GUI.  Returns the total (undiscounted) reward
+      collected by each environment.
+    """
+    if decision is None: decision = agent.getAction
+    observeTransition = getattr(agent, 'observeTransition', None)
+    if 'startEpisode' in dir(agent): agent.startEpisode()
+
+    totals = [0.0] * len(environments)
+    for step in range(steps):
+        for i, environment in enumerate(environments):
+            state = environment.getCurrentState()
+            if len(environment.getPossibleActions(state)) == 0:
+                environment.reset()
+                state = environment.getCurrentState()
+            action = decision(state)
+            if action == None:
+                raise Exception('None action returned: Code Not Complete')
+            nextState, reward = environment.doAction(action)
+            if observeTransition is not None:
+                observeTransition(state, action, nextState, reward)
+            totals[i] += reward
+    return totals
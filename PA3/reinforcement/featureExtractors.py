@@ -16,6 +16,7 @@
 
 from game import Directions, Actions
 import util
+import collections
 
 class FeatureExtractor:
     def getFeatures(self, state, action):
@@ -26,6 +27,16 @@ class FeatureExtractor:
         """
         util.raiseNotDefined()
 
+    def getFeaturesForAllActions(self, state, actions=None):
+        """
+          Returns a dict from each action (by default, each legal action in
+          state) to its features.  Extractors can override this to share
+          work between the actions of a state.
+        """
+        if actions is None:
+            actions = state.getLegalActions()
+        return dict((action, self.getFeatures(state, action)) for action in actions)
+
 class IdentityExtractor(FeatureExtractor):
     def getFeatures(self, state, action):
         feats = util.Counter()
@@ -41,11 +52,21 @@ class CoordinateExtractor(FeatureExtractor):
         feats['action=%s' % action] = 1.0
         return feats
 
-def closestFood(pos, food, walls):
+def closestFood(pos, food, walls, distances=None, legalMoves=None):
     """
     closestFood -- this is similar to the function that we have
     worked on in the search project; here its all in one place
+
+    Given the layout's MazeDistances, cells are scanned in order of their
+    precomputed distance from pos instead of searched.  Otherwise the search
+    takes neighbouring cells from the layout's LegalMoves table if given.
     """
+    if distances is not None:
+        return distances.getClosest(pos, food)
+    if legalMoves is not None:
+        getLegalNeighbors = legalMoves.getLegalNeighbors
+    else:
+        getLegalNeighbors = lambda position: Actions.getLegalNeighbors(position, walls)
     fringe = [(pos[0], pos[1], 0)]
     expanded = set()
     while fringe:
@@ -57,7 +78,7 @@ def closestFood(pos, food, walls):
         if food[pos_x][pos_y]:
             return dist
         # otherwise spread out from the location to its neighbours
-        nbrs = Actions.getLegalNeighbors((pos_x, pos_y), walls)
+        nbrs = getLegalNeighbors((pos_x, pos_y))
         for nbr_x, nbr_y in nbrs:
             fringe.append((nbr_x, nbr_y, dist+1))
     # no food found
@@ -70,34 +91,95 @@ class SimpleExtractor(FeatureExtractor):
     - how far away the next food is
     - whether a ghost collision is imminent
     - whether a ghost is one step away
+
+    Features depend only on Pacman's position, the food, the walls and the
+    ghost positions, so they are memoized in a least recently used cache of
+    cacheSize entries keyed by those (see stateKey) and the action.
+    getFeaturesForAllActions looks up the ghosts' neighbours and the
+    layout's maze distance table once for all of a state's actions.
+    Returned Counters are copies, so callers may modify them.
     """
 
+    def __init__(self, cacheSize=10000):
+        self.cacheSize = cacheSize
+        self.cache = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def stateKey(self, state):
+        return (state.getPacmanPosition(), tuple(state.getGhostPositions()),
+                state.getFood(), state.getWalls())
+
     def getFeatures(self, state, action):
+        return self.getFeaturesForAllActions(state, [action])[action]
+
+    def getFeaturesForAllActions(self, state, actions=None):
+        if actions is None:
+            actions = state.getLegalActions()
+        stateKey = self.stateKey(state)
+        allFeatures = {}
+        context = None
+        for action in actions:
+            key = (stateKey, action)
+            features = self.cache.get(key)
+            if features is None:
+                self.misses += 1
+                if context is None:
+                    context = self.getStateContext(state)
+                features = self.computeFeatures(context, action)
+                self.cache[key] = features
+                if len(self.cache) > self.cacheSize:
+                    self.cache.popitem(last=False)
+            else:
+                self.hits += 1
+                self.cache.move_to_end(key)
+            allFeatures[action] = features.copy()
+        return allFeatures
+
+    def getStateContext(self, state):
+        """
+        The parts of state that features are computed from, shared by all
+        of its actions.
+        """
         # extract the grid of food and wall locations and get the ghost locations
         food = state.getFood()
         walls = state.getWalls()
         ghosts = state.getGhostPositions()
+        legalMoves = state.data.layout.getLegalMoves()
+        ghostNeighbors = [legalMoves.getLegalNeighbors(g) for g in ghosts]
+        return (state.getPacmanPosition(), food, walls, ghostNeighbors,
+                state.data.layout.getMazeDistances())
+
+    def computeFeatures(self, context, action):
+        (x, y), food, walls, ghostNeighbors, distances = context
 
         features = util.Counter()
 
         features["bias"] = 1.0
 
         # compute the location of pacman after he takes the action
-        x, y = state.getPacmanPosition()
         dx, dy = Actions.directionToVector(action)
         next_x, next_y = int(x + dx), int(y + dy)
 
         # count the number of ghosts 1-step away
-        features["#-of-ghosts-1-step-away"] = sum((next_x, next_y) in Actions.getLegalNeighbors(g, walls) for g in ghosts)
+        features["#-of-ghosts-1-step-away"] = sum((next_x, next_y) in neighbors for neighbors in ghostNeighbors)
 
         # if there is no danger of ghosts then add the food feature
         if not features["#-of-ghosts-1-step-away"] and food[next_x][next_y]:
             features["eats-food"] = 1.0
 
-        dist = closestFood((next_x, next_y), food, walls)
+        dist = closestFood((next_x, next_y), food, walls, distances)
         if dist is not None:
             # make the distance a number less than one otherwise the update
             # will diverge wildly
             features["closest-food"] = float(dist) / (walls.width * walls.height)
         features.divideAll(10.0)
         return features
+
+    def cacheReport(self):
+        lookups = self.hits + self.misses
+        hitRate = 0.0
+        if lookups > 0:
+            hitRate = float(self.hits) / lookups
+        return 'hits %d, misses %d (hit rate %.2f), %d cached' % (
+            self.hits, self.misses, hitRate, len(self.cache))
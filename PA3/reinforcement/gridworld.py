@@ -32,6 +32,12 @@ class Gridworld(mdp.MarkovDecisionProcess):
         self.livingReward = 0.0
         self.noise = 0.2
 
+        # tables built by __compile for the current parameters
+        self.__states = None
+        self.__stateIndex = None
+        self.__transitions = None
+        self.__rewards = None
+
     def setLivingReward(self, reward):
         """
         The (negative) reward for exiting "normal" states.
@@ -41,12 +47,38 @@ class Gridworld(mdp.MarkovDecisionProcess):
         future rewards.
         """
         self.livingReward = reward
+        self.__states = None
 
     def setNoise(self, noise):
         """
         The probability of moving in an unintended direction.
         """
         self.noise = noise
+        self.__states = None
+
+    def __compile(self):
+        """
+        Builds the state list, the state index and the transitions and
+        rewards of every (state, action) pair for the current noise and
+        living reward.  The tables are rebuilt after setNoise or
+        setLivingReward; the grid itself must not change afterwards.
+        """
+        states = [self.grid.terminalState]
+        for x in range(self.grid.width):
+            for y in range(self.grid.height):
+                if self.grid[x][y] != '#':
+                    state = (x,y)
+                    states.append(state)
+        transitions = {}
+        rewards = {}
+        for state in states:
+            rewards[state] = self.__computeReward(state)
+            for action in self.getPossibleActions(state):
+                transitions[(state, action)] = tuple(self.__computeTransitionStatesAndProbs(state, action))
+        self.__stateIndex = dict((state, i) for i, state in enumerate(states))
+        self.__transitions = transitions
+        self.__rewards = rewards
+        self.__states = states
 
 
     def getPossibleActions(self, state):
@@ -66,16 +98,20 @@ class Gridworld(mdp.MarkovDecisionProcess):
 
     def getStates(self):
         """
-        Return list of all states.
+        Return list of all states.  The list is shared between calls and
+        must not be modified.
         """
-        # The true terminal state.
-        states = [self.grid.terminalState]
-        for x in range(self.grid.width):
-            for y in range(self.grid.height):
-                if self.grid[x][y] != '#':
-                    state = (x,y)
-                    states.append(state)
-        return states
+        if self.__states is None:
+            self.__compile()
+        return self.__states
+
+    def getStateIndex(self, state):
+        """
+        Returns the position of state in the list from getStates.
+        """
+        if self.__states is None:
+            self.__compile()
+        return self.__stateIndex[state]
 
     def getReward(self, state, action, nextState):
         """
@@ -85,6 +121,13 @@ class Gridworld(mdp.MarkovDecisionProcess):
         departed (as in the R+N book examples, which more or
         less use this convention).
         """
+        if self.__states is None:
+            self.__compile()
+        if state in self.__rewards:
+            return self.__rewards[state]
+        return self.__computeReward(state)
+
+    def __computeReward(self, state):
         if state == self.grid.terminalState:
             return 0.0
         x, y = state
@@ -118,7 +161,13 @@ class Gridworld(mdp.MarkovDecisionProcess):
         from 'state' by taking 'action' along
         with their transition probabilities.
         """
+        if self.__states is None:
+            self.__compile()
+        if (state, action) in self.__transitions:
+            return self.__transitions[(state, action)]
+        return self.__computeTransitionStatesAndProbs(state, action)
 
+    def __computeTransitionStatesAndProbs(self, state, action):
         if action not in self.getPossibleActions(state):
             raise Exception("Illegal action!")
 
@@ -311,6 +360,26 @@ def getMazeGrid():
             ['S',' ',' ',' ']]
     return Gridworld(grid)
 
+def getRandomMazeGrid(width=20, height=20, seed=0):
+    """
+    A generated maze, larger than the grids above, for comparing how
+    quickly the value iteration agents converge.  About a fifth of the
+    cells are walls and a few are -1 exits; the +1 exit is in the top
+    right corner and the start in the bottom left.
+    """
+    rand = random.Random(seed)
+    grid = [[' ' for x in range(width)] for y in range(height)]
+    for y in range(height):
+        for x in range(width):
+            r = rand.random()
+            if r < 0.2:
+                grid[y][x] = '#'
+            elif r < 0.23:
+                grid[y][x] = -1
+    grid[0][width - 1] = +1
+    grid[height - 1][0] = 'S'
+    return Gridworld(grid)
+
 
 
 def getUserAction(state, actionFunction):
@@ -426,6 +495,9 @@ def parseOptions():
                          help='Manually control agent')
     optParser.add_option('-v', '--valueSteps',action='store_true' ,default=False,
                          help='Display each step of value iteration')
+    optParser.add_option('--envs',action='store',
+                         type='int',dest='envs',default=1,
+                         metavar="N", help='Step N environments in lockstep when running quiet episodes (default %default)')
 
     opts, args = optParser.parse_args()
 
@@ -514,16 +586,21 @@ if __name__ == '__main__':
         a = valueIterationAgents.AsynchronousValueIterationAgent(mdp, opts.discount, opts.iters)
     elif opts.agent == 'priosweepvalue':
         a = valueIterationAgents.PrioritizedSweepingValueIterationAgent(mdp, opts.discount, opts.iters)
+    elif opts.agent == 'vectorvalue':
+        a = valueIterationAgents.VectorizedValueIterationAgent(mdp, opts.discount, opts.iters)
     else:
         if not opts.manual: raise Exception('Unknown agent type: '+opts.agent)
 
+    if not opts.manual and opts.agent in ('value', 'asynchvalue', 'priosweepvalue', 'vectorvalue'):
+        print("CONVERGENCE: " + a.convergenceReport())
+
 
     ###########################
     # RUN EPISODES
     ###########################
     # DISPLAY Q/V VALUES BEFORE SIMULATION OF EPISODES
     try:
-        if not opts.manual and opts.agent in ('value', 'asynchvalue', 'priosweepvalue'):
+        if not opts.manual and opts.agent in ('value', 'asynchvalue', 'priosweepvalue', 'vectorvalue'):
             if opts.valueSteps:
                 for i in range(opts.iters):
                     tempAgent = valueIterationAgents.ValueIterationAgent(mdp, opts.discount, i)
@@ -545,7 +622,7 @@ if __name__ == '__main__':
         if opts.manual and opts.agent == None:
             displayCallback = lambda state: display.displayNullValues(state)
         else:
-            if opts.agent in ('random', 'value', 'asynchvalue', 'priosweepvalue'):
+            if opts.agent in ('random', 'value', 'asynchvalue', 'priosweepvalue', 'vectorvalue'):
                 displayCallback = lambda state: display.displayValues(a, state, "CURRENT VALUES")
             if opts.agent == 'q': displayCallback = lambda state: display.displayQValues(a, state, "CURRENT Q-VALUES")
 
@@ -570,8 +647,12 @@ if __name__ == '__main__':
         print("RUNNING", opts.episodes, "EPISODES")
         print()
     returns = 0
-    for episode in range(1, opts.episodes+1):
-        returns += runEpisode(a, env, opts.discount, decisionCallback, displayCallback, messageCallback, pauseCallback, episode)
+    if opts.envs > 1 and opts.quiet and not opts.manual:
+        envs = [env] + [gridworld.GridworldEnvironment(mdp) for i in range(opts.envs - 1)]
+        returns = sum(environment.runBatchedEpisodes(a, envs, opts.discount, opts.episodes, decisionCallback))
+    else:
+        for episode in range(1, opts.episodes+1):
+            returns += runEpisode(a, env, opts.discount, decisionCallback, displayCallback, messageCallback, pauseCallback, episode)
     if opts.episodes > 0:
         print()
         print("AVERAGE RETURNS FROM START STATE: "+str((returns+0.0) / opts.episodes))
@@ -15,6 +15,7 @@
 from game import Directions, Agent, Actions
 
 import random,util,time
+import array
 
 class ValueEstimationAgent(Agent):
     """
@@ -132,6 +133,14 @@ class ReinforcementAgent(ValueEstimationAgent):
         self.episodeRewards += deltaReward
         self.update(state,action,nextState,deltaReward)
 
+        if self.replayBuffer is not None and self.isInTraining():
+            self.replayBuffer.add(state, action, nextState, deltaReward)
+            self.replayCredit += self.replayRatio
+            while self.replayCredit >= 1:
+                self.replayCredit -= 1
+                for transition in self.replayBuffer.sample(self.replaySteps):
+                    self.update(*transition)
+
     def startEpisode(self):
         """
           Called by environment when new episode is starting
@@ -149,18 +158,31 @@ class ReinforcementAgent(ValueEstimationAgent):
         else:
             self.accumTestRewards += self.episodeRewards
         self.episodesSoFar += 1
+        tableSize = self.getTableSize()
+        self.episodeTableGrowth = tableSize - self.tableSize
+        self.tableSize = tableSize
         if self.episodesSoFar >= self.numTraining:
             # Take off the training wheels
             self.epsilon = 0.0    # no exploration
             self.alpha = 0.0      # no learning
 
+    def getTableSize(self):
+        """
+          Returns the number of entries the agent keeps for its value
+          estimates, such as the (state, action) pairs of a Q-table.  It is
+          recorded at the end of each episode to report how fast the table
+          grows; agents that keep one should override this.
+        """
+        return 0
+
     def isInTraining(self):
         return self.episodesSoFar < self.numTraining
 
     def isInTesting(self):
         return not self.isInTraining()
 
-    def __init__(self, actionFn = None, numTraining=100, epsilon=0.5, alpha=0.5, gamma=1):
+    def __init__(self, actionFn = None, numTraining=100, epsilon=0.5, alpha=0.5, gamma=1,
+                 replaySize=0, replaySteps=32, replayRatio=1.0, replaySeed=0):
         """
         actionFn: Function which takes a state and returns the list of legal actions
 
@@ -168,6 +190,15 @@ class ReinforcementAgent(ValueEstimationAgent):
         epsilon  - exploration rate
         gamma    - discount factor
         numTraining - number of training episodes, i.e. no learning after these many episodes
+
+        Experience replay is off unless replaySize is set:
+        replaySize  - number of recent transitions kept for replay
+        replaySteps - transitions replayed per round, each passed to update
+                      on its own
+        replayRatio - rounds replayed per observed transition; 0.25 replays
+                      a round every fourth transition
+        replaySeed  - seed of the buffer's own random number generator, so
+                      replay leaves the game's random sequence alone
         """
         if actionFn == None:
             actionFn = lambda state: state.getLegalActions()
@@ -179,6 +210,17 @@ class ReinforcementAgent(ValueEstimationAgent):
         self.epsilon = float(epsilon)
         self.alpha = float(alpha)
         self.discount = float(gamma)
+        self.replayBuffer = None
+        if int(replaySize) > 0:
+            self.replayBuffer = ReplayBuffer(int(replaySize), int(replaySeed))
+        self.replaySteps = int(replaySteps)
+        self.replayRatio = float(replayRatio)
+        self.replayCredit = 0.0
+        # Entries in the agent's table after the last episode, and how many
+        # that episode and the last status report's window of episodes added
+        self.tableSize = 0
+        self.episodeTableGrowth = 0
+        self.lastWindowTableSize = 0
 
     ################################
     # Controls needed for Crawler  #
@@ -250,9 +292,57 @@ class ReinforcementAgent(ValueEstimationAgent):
             print('\tAverage Rewards for last %d episodes: %.2f'  % (
                     NUM_EPS_UPDATE,windowAvg))
             print('\tEpisode took %.2f seconds' % (time.time() - self.episodeStartTime))
+            print('\tTable size: %d entries, %.1f added per episode over last %d episodes' % (
+                    self.tableSize, (self.tableSize - self.lastWindowTableSize) / float(NUM_EPS_UPDATE),
+                    NUM_EPS_UPDATE))
             self.lastWindowAccumRewards = 0.0
+            self.lastWindowTableSize = self.tableSize
             self.episodeStartTime = time.time()
 
         if self.episodesSoFar == self.numTraining:
             msg = 'Training Done (turning off epsilon and alpha)'
             print('%s\n%s' % (msg,'-' * len(msg)))
+
+class ReplayBuffer:
+    """
+      A fixed-capacity ring buffer of (state, action, nextState, reward)
+      transitions for experience replay.  Transitions are stored in
+      preallocated parallel arrays; once the buffer is full each new
+      transition overwrites the oldest one.  Samples are drawn from a
+      random number generator of the buffer's own, seeded with seed.
+    """
+    def __init__(self, capacity, seed=0):
+        self.capacity = capacity
+        self.random = random.Random(seed)
+        self.states = [None] * capacity
+        self.actions = [None] * capacity
+        self.nextStates = [None] * capacity
+        self.rewards = array.array('d', [0.0]) * capacity
+        self.next = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, nextState, reward):
+        i = self.next
+        self.states[i] = state
+        self.actions[i] = action
+        self.nextStates[i] = nextState
+        self.rewards[i] = reward
+        self.next = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, count):
+        """
+          Returns count transitions drawn uniformly, with replacement,
+          from the buffer.
+        """
+        if self.size == 0:
+            return []
+        randrange = self.random.randrange
+        transitions = []
+        for n in range(count):
+            i = randrange(self.size)
+            transitions.append((self.states[i], self.actions[i], self.nextStates[i], self.rewards[i]))
+        return transitions
@@ -17,6 +17,7 @@ from learningAgents import ReinforcementAgent
 from featureExtractors import *
 
 import random,util,math
+import array
 
 class QLearningAgent(ReinforcementAgent):
     """
@@ -52,7 +53,11 @@ class QLearningAgent(ReinforcementAgent):
           or the Q node value otherwise
         """
         "*** YOUR CODE HERE ***"
-        return self.q_values[(state, action)]
+        # peek so that scoring unseen pairs does not add them to the table
+        return self.q_values.peek((state, action))
+
+    def getTableSize(self):
+        return len(self.q_values)
 
     def computeValueFromQValues(self, state):
         """
@@ -67,9 +72,9 @@ class QLearningAgent(ReinforcementAgent):
         if len(actions) == 0:
           return 0
         max_q_value = float("-inf")
-        for action in actions:
-          if self.getQValue(state, action) > max_q_value:
-            max_q_value = self.getQValue(state, action)
+        for q_value in self.getQValues(state, actions):
+          if q_value > max_q_value:
+            max_q_value = q_value
         return max_q_value
 
     def computeActionFromQValues(self, state):
@@ -82,12 +87,19 @@ class QLearningAgent(ReinforcementAgent):
         actions = self.getLegalActions(state)
         max_q_value = float("-inf")
         max_action = None
-        for action in actions:
-          if self.getQValue(state, action) > max_q_value:
-            max_q_value = self.getQValue(state, action)
+        for action, q_value in zip(actions, self.getQValues(state, actions)):
+          if q_value > max_q_value:
+            max_q_value = q_value
             max_action = action
         return max_action
 
+    def getQValues(self, state, actions):
+        """
+          Returns the list of Q(state,action) for each of actions.
+          Subclasses can override this to score all actions at once.
+        """
+        return [self.getQValue(state, action) for action in actions]
+
     def getAction(self, state):
         """
           Compute the action to take in the current state.  With
@@ -169,6 +181,59 @@ class PacmanQAgent(QLearningAgent):
         return action
 
 
+class WeightVector:
+    """
+      Weights of a linear function of named features.  Each feature name
+      is interned to an integer id the first time it is seen, and its
+      weight is kept at that position of a contiguous array of doubles.
+      Feature Counters are converted once with index into lists of
+      (id, value) pairs, so dot products and updates touch only the
+      array instead of dicts keyed by strings.
+    """
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+        self.values = array.array('d')
+
+    def index(self, features):
+        """
+          Returns features as a list of (id, value) pairs, giving new
+          feature names a weight of 0.
+        """
+        ids = self.ids
+        indexed = []
+        for name, value in features.items():
+            id = ids.get(name)
+            if id is None:
+                id = ids[name] = len(self.names)
+                self.names.append(name)
+                self.values.append(0.0)
+            indexed.append((id, value))
+        return indexed
+
+    def dot(self, indexed):
+        values = self.values
+        total = 0
+        for id, value in indexed:
+            total += values[id] * value
+        return total
+
+    def dotEach(self, indexedList):
+        "The dot product with each of a list of indexed feature vectors."
+        return [self.dot(indexed) for indexed in indexedList]
+
+    def add(self, indexed, scale):
+        "Adds scale times the indexed feature vector to the weights."
+        values = self.values
+        for id, value in indexed:
+            values[id] += scale * value
+
+    def asCounter(self):
+        weights = util.Counter()
+        for id, name in enumerate(self.names):
+            weights[name] = self.values[id]
+        return weights
+
 class ApproximateQAgent(PacmanQAgent):
     """
        ApproximateQLearningAgent
@@ -177,28 +242,61 @@ class ApproximateQAgent(PacmanQAgent):
        and update.  All other QLearningAgent functions
        should work as is.
     """
-    def __init__(self, extractor='IdentityExtractor', **args):
+    def __init__(self, extractor='IdentityExtractor', verbose='0', **args):
         self.featExtractor = util.lookup(extractor, globals())()
+        # Statistics are printed when training ends with -a verbose=1
+        self.verbose = int(verbose)
         PacmanQAgent.__init__(self, **args)
-        self.weights = util.Counter()
+        # Weights are kept in a WeightVector; getWeights returns a Counter copy
+        self.weightVector = WeightVector()
+        # Indexed feature vectors of recently scored states, by state and action
+        self.featureCache = {}
 
     def getWeights(self):
-        return self.weights
+        return self.weightVector.asCounter()
+
+    def getTableSize(self):
+        return len(self.weightVector.names)
+
+    def getFeatureVectors(self, state, actions):
+        """
+          The indexed features of state with each of actions, extracted for
+          all of them at once.  Vectors of the two most recent states are
+          kept, since each transition scores a state in update that
+          getAction scores again.
+        """
+        vectors = self.featureCache.get(state)
+        if vectors is None:
+            if len(self.featureCache) >= 2:
+                del self.featureCache[next(iter(self.featureCache))]
+            vectors = self.featureCache[state] = {}
+        missing = [action for action in actions if action not in vectors]
+        if missing:
+            features = self.featExtractor.getFeaturesForAllActions(state, missing)
+            for action in missing:
+                vectors[action] = self.weightVector.index(features[action])
+        return [vectors[action] for action in actions]
+
+    def getFeatureVector(self, state, action):
+        return self.getFeatureVectors(state, [action])[0]
 
     def getQValue(self, state, action):
         """
           Should return Q(state,action) = w * featureVector
           where * is the dotProduct operator
         """
-        "*** YOUR CODE HERE ***"
-        util.raiseNotDefined()
+        return self.weightVector.dot(self.getFeatureVector(state, action))
+
+    def getQValues(self, state, actions):
+        return self.weightVector.dotEach(self.getFeatureVectors(state, actions))
 
     def update(self, state, action, nextState, reward):
         """
            Should update your weights based on transition
         """
-        "*** YOUR CODE HERE ***"
-        util.raiseNotDefined()
+        features = self.getFeatureVector(state, action)
+        difference = (reward + self.discount * self.computeValueFromQValues(nextState)) - self.weightVector.dot(features)
+        self.weightVector.add(features, self.alpha * difference)
 
     def final(self, state):
         "Called at the end of each game."
@@ -208,5 +306,5 @@ class ApproximateQAgent(PacmanQAgent):
         # did we finish training?
         if self.episodesSoFar == self.numTraining:
             # you might want to print your weights here for debugging
-            "*** YOUR CODE HERE ***"
-            pass
+            if self.verbose and hasattr(self.featExtractor, 'cacheReport'):
+                print('Feature cache: %s' % self.featExtractor.cacheReport())
@@ -12,15 +12,98 @@
 # Pieter Abbeel (pabbeel@cs.berkeley.edu).
 
 
+import atexit
+import os
+import pickle
 import re
 import sys
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Parsed test files are cached in one file per directory, keyed by the
+# modification time and size of each file.  Bump CACHE_VERSION whenever the
+# parsing rules below change.  Files parsed anew are kept in _pendingEntries
+# until flushCaches writes them out.
+CACHE_NAME = '.parsed_tests'
+CACHE_VERSION = 1
+_directoryCaches = {}
+_pendingEntries = {}
+
+
+def loadCache(directory):
+    if directory not in _directoryCaches:
+        try:
+            with open(os.path.join(directory, CACHE_NAME), 'rb') as handle:
+                _directoryCaches[directory] = pickle.load(handle)
+        except Exception:
+            _directoryCaches[directory] = {}
+    return _directoryCaches[directory]
+
+
+def saveCache(directory, entries):
+    """
+    Adds entries to the cache file of a directory.  The entries are merged
+    into what the file holds when it is written, so graders running in
+    parallel keep the entries of files that the others parsed, and the file
+    is written through a temporary file, so they never read a partly
+    written cache.  Where fcntl is available the read, merge and write are
+    done holding a lock on a file beside the cache, so that two graders
+    writing at once do not drop each other's entries; elsewhere the last to
+    write wins.  Directories that cannot be written to are simply parsed
+    every time.
+    """
+    path = os.path.join(directory, CACHE_NAME)
+    lock = None
+    if fcntl is not None:
+        try:
+            lock = open(path + '.lock', 'a')
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        except OSError:
+            if lock is not None:
+                lock.close()
+            lock = None
+    try:
+        try:
+            with open(path, 'rb') as handle:
+                cache = pickle.load(handle)
+        except Exception:
+            cache = {}
+        cache.update(entries)
+        _directoryCaches[directory] = cache
+        temp = '%s.%d' % (path, os.getpid())
+        try:
+            with open(temp, 'wb') as handle:
+                pickle.dump(cache, handle)
+            os.replace(temp, path)
+        except OSError:
+            pass
+    finally:
+        if lock is not None:
+            lock.close()
+
+
+def flushCaches():
+    """
+    Writes the files parsed since the last flush to their directories'
+    caches, each cache file once.
+    """
+    while _pendingEntries:
+        directory, entries = _pendingEntries.popitem()
+        saveCache(directory, entries)
+
+
+atexit.register(flushCaches)
+
 
 class TestParser(object):
 
-    def __init__(self, path):
+    def __init__(self, path, useCache=True):
         # save the path to the test file
         self.path = path
+        self.useCache = useCache
 
     def removeComments(self, rawlines):
         # remove any portion of a line following a '#' symbol
@@ -34,6 +117,29 @@ class TestParser(object):
         return '\n'.join(fixed_lines)
 
     def parse(self):
+        """
+        Returns the dictionary for the test file, taken from the directory's
+        cache when the file has not changed since it was last parsed.  Every
+        call returns a new dictionary, which callers are free to modify.
+        """
+        if not self.useCache:
+            return self.parseText()
+        directory, name = os.path.split(self.path)
+        stat = os.stat(self.path)
+        stamp = (CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+        cache = loadCache(directory)
+        if name in cache and cache[name][0] == stamp:
+            test = pickle.loads(cache[name][1])
+            # the file may set its own path property
+            if ('oneline', 'path') not in test['__emit__'] and ('multiline', 'path') not in test['__emit__']:
+                test['path'] = self.path
+            return test
+        test = self.parseText()
+        cache[name] = (stamp, pickle.dumps(test))
+        _pendingEntries.setdefault(directory, {})[name] = cache[name]
+        return test
+
+    def parseText(self):
         # read in the test case and remove comments
         test = {}
         with open(self.path) as handle:
@@ -33,6 +33,14 @@ import heapq
 import random
 import io
 import functools
+import array
+import operator
+
+try:
+    import numpy
+    _NUMPY_ENABLED = True
+except ImportError:
+    _NUMPY_ENABLED = False
 
 class Experiences(object):
     def __init__(self, test_name):
@@ -208,38 +216,91 @@ class PriorityQueue:
     has a priority associated with it and the client is usually interested
     in quick retrieval of the lowest-priority item in the queue. This
     data structure allows O(1) access to the lowest-priority item.
+
+    The live heap entries of each item are indexed by item so update() is
+    O(log n): a decrease-key marks the item's lowest entry as removed and
+    pushes a replacement, and pop() discards removed entries as they
+    surface.  An item pushed more than once has one live entry per push.
     """
+    REMOVED = object()
 
     def __init__(self):
         self.heap = []
         self.count = 0
+        self.size = 0
+        self.entries = {}
 
     def push(self, item, priority):
-        entry = (priority, self.count, item)
+        entry = [priority, self.count, item]
         heapq.heappush(self.heap, entry)
         self.count += 1
+        self.size += 1
+        self._index(item, entry)
 
     def pop(self):
-        (_, _, item) = heapq.heappop(self.heap)
-        return item
+        while self.heap:
+            (_, _, item) = entry = heapq.heappop(self.heap)
+            if item is PriorityQueue.REMOVED:
+                continue
+            self.size -= 1
+            self._unindex(item, entry)
+            return item
+        raise IndexError('pop from an empty priority queue')
 
     def isEmpty(self):
-        return len(self.heap) == 0
+        return self.size == 0
 
     def update(self, item, priority):
-        # If item already in priority queue with higher priority, update its priority and rebuild the heap.
+        # If item already in priority queue with higher priority, update its priority.
         # If item already in priority queue with equal or lower priority, do nothing.
         # If item not in priority queue, do the same thing as self.push.
-        for index, (p, c, i) in enumerate(self.heap):
-            if i == item:
-                if p <= priority:
-                    break
-                del self.heap[index]
-                self.heap.append((priority, c, item))
-                heapq.heapify(self.heap)
-                break
-        else:
+        entry = self._find(item)
+        if entry is None:
             self.push(item, priority)
+            return
+        if entry[0] <= priority:
+            return
+        # Invalidate the old entry and push a replacement that keeps its
+        # insertion count, so ties are still broken in FIFO order
+        entry[2] = PriorityQueue.REMOVED
+        newEntry = [priority, entry[1], item]
+        heapq.heappush(self.heap, newEntry)
+        self._unindex(item, entry)
+        self._index(item, newEntry)
+
+    def _index(self, item, entry):
+        try:
+            self.entries.setdefault(item, []).append(entry)
+        except TypeError:
+            # Unhashable items are found by scanning the heap in _find
+            pass
+
+    def _unindex(self, item, entry):
+        try:
+            live = self.entries.get(item)
+        except TypeError:
+            return
+        for i in range(len(live)):
+            if live[i] is entry:
+                del live[i]
+                break
+        if not live:
+            del self.entries[item]
+
+    def _find(self, item):
+        """
+        Returns the live entry of item that would pop first, or None if item
+        is not in the queue.
+        """
+        try:
+            live = self.entries.get(item)
+        except TypeError:
+            live = [entry for entry in self.heap
+                    if entry[2] is not PriorityQueue.REMOVED and entry[2] == item]
+        if not live:
+            return None
+        # Insertion counts are unique, so items themselves are never compared
+        return min(live)
 
 
 class PriorityQueueWithFunction(PriorityQueue):
@@ -317,6 +378,19 @@ class Counter(dict):
         self.setdefault(idx, 0)
         return dict.__getitem__(self, idx)
 
+    def peek(self, idx, default=0):
+        """
+        Returns the count of idx, or default if it has none, without adding
+        idx to the counter as reading it with [] does.
+
+        >>> a = Counter()
+        >>> a.peek('test')
+        0
+        >>> 'test' in a
+        False
+        """
+        return dict.get(self, idx, default)
+
     def incrementAll(self, keys, count):
         """
         Increments all elements of keys by the same count.
@@ -490,6 +564,289 @@ class Counter(dict):
         return addend
 
 
+class KeySpace:
+    """
+    Interns keys to consecutive integer ids.  DenseCounters created over the
+    same KeySpace store each key's count at the same position, so arithmetic
+    between them lines up their arrays instead of looking keys up.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.keys = []
+
+    def intern(self, key):
+        id = self.ids.get(key)
+        if id is None:
+            id = self.ids[key] = len(self.keys)
+            self.keys.append(key)
+        return id
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class DenseCounter:
+    """
+    A Counter whose counts are kept in an array of doubles indexed by the ids
+    of a KeySpace, with the same dictionary-like interface.  Dot products,
+    sums, normalization and argMax between counters over the same space run
+    over the arrays in C, or in numpy for spaces of at least NUMPY_MIN_KEYS
+    keys when it is installed; with other counters or dictionaries they fall
+    back to looking keys up one by one.
+
+    It differs from Counter in that reading a missing key returns 0 without
+    adding it, counts are floats, keys come out in the order the space
+    first saw them, which is also how argMax breaks ties, and adding a
+    counter to it from the left gives a new counter.
+
+    The arrays pay off on arithmetic between long vectors.  For counters of
+    a handful of keys, sparse vectors in a large space, and argMax without
+    numpy, it can be slower than Counter; benchmarks.py compares the two.
+
+    >>> a = DenseCounter()
+    >>> b = DenseCounter(a.space)
+    >>> a['first'] = -2
+    >>> a['second'] = 4
+    >>> b['first'] = 3
+    >>> b['second'] = 5
+    >>> a * b
+    14.0
+    >>> (a + b).argMax()
+    'second'
+    """
+
+    NUMPY_MIN_KEYS = 256
+
+    def __init__(self, space=None, counts=None):
+        if space is None:
+            space = KeySpace()
+        self.space = space
+        self.counts = array.array('d', bytes(8 * len(space)))
+        self.present = bytearray(len(space))
+        if counts is not None:
+            for key, value in counts.items():
+                self[key] = value
+
+    def grow(self, size):
+        "Makes room for the first size ids of the space."
+        missing = size - len(self.counts)
+        if missing > 0:
+            self.counts.extend(array.array('d', bytes(8 * missing)))
+            self.present.extend(bytes(missing))
+
+    def __getitem__(self, key):
+        id = self.space.ids.get(key)
+        if id is None or id >= len(self.counts):
+            return 0
+        return self.counts[id]
+
+    def peek(self, key, default=0):
+        "Returns the count of key, or default if it has none."
+        if key in self:
+            return self[key]
+        return default
+
+    def __setitem__(self, key, value):
+        id = self.space.intern(key)
+        if id >= len(self.counts):
+            self.grow(len(self.space))
+        self.counts[id] = value
+        self.present[id] = 1
+
+    def __delitem__(self, key):
+        id = self.space.ids.get(key)
+        if id is None or id >= len(self.counts) or not self.present[id]:
+            raise KeyError(key)
+        self.counts[id] = 0.0
+        self.present[id] = 0
+
+    def __contains__(self, key):
+        id = self.space.ids.get(key)
+        return id is not None and id < len(self.present) and self.present[id] == 1
+
+    def ids(self):
+        "The ids of the keys in the counter, in order."
+        present = self.present
+        return [id for id in range(len(present)) if present[id]]
+
+    def keys(self):
+        keys = self.space.keys
+        return [keys[id] for id in self.ids()]
+
+    def values(self):
+        counts = self.counts
+        return [counts[id] for id in self.ids()]
+
+    def items(self):
+        keys = self.space.keys
+        counts = self.counts
+        return [(keys[id], counts[id]) for id in self.ids()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return self.present.count(1)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def update(self, counts):
+        for key, value in counts.items():
+            self[key] = value
+
+    def __eq__(self, y):
+        return dict(self.items()) == dict(y.items())
+
+    def __repr__(self):
+        return 'DenseCounter(%r)' % dict(self.items())
+
+    def asArray(self):
+        """
+        A numpy view of the counts.  The counts array cannot be resized while
+        a view of it is alive, so adding a key new to the counter's space then
+        raises BufferError; drop the view first.
+        """
+        return numpy.frombuffer(self.counts, dtype=float)
+
+    def useNumpy(self):
+        return _NUMPY_ENABLED and len(self.counts) >= DenseCounter.NUMPY_MIN_KEYS
+
+    def sharesSpace(self, y):
+        return isinstance(y, DenseCounter) and y.space is self.space
+
+    def incrementAll(self, keys, count):
+        """
+        Increments all elements of keys by the same count.
+        """
+        for key in keys:
+            self[key] += count
+
+    def argMax(self):
+        """
+        Returns the key with the highest value.
+        """
+        if self.useNumpy():
+            if not self.present.count(1):
+                return None
+            present = numpy.frombuffer(self.present, dtype=numpy.uint8)
+            counts = numpy.where(present == 1, self.asArray(), -numpy.inf)
+            return self.space.keys[int(numpy.argmax(counts))]
+        counts = self.counts
+        if len(counts) and self.present.count(1) == len(counts):
+            return self.space.keys[counts.index(max(counts))]
+        ids = self.ids()
+        if len(ids) == 0:
+            return None
+        return self.space.keys[max(ids, key=counts.__getitem__)]
+
+    def sortedKeys(self):
+        """
+        Returns a list of keys sorted by their values.  Keys
+        with the highest values will appear first.
+        """
+        counts = self.counts
+        keys = self.space.keys
+        return [keys[id] for id in sorted(self.ids(), key=lambda id: -counts[id])]
+
+    def totalCount(self):
+        """
+        Returns the sum of counts for all keys.
+        """
+        if self.useNumpy():
+            return float(self.asArray().sum())
+        return sum(self.counts)
+
+    def normalize(self):
+        """
+        Edits the counter such that the total count of all
+        keys sums to 1.  The ratio of counts for all keys
+        will remain the same.
+        """
+        total = float(self.totalCount())
+        if total == 0:
+            return
+        self.divideAll(total)
+
+    def divideAll(self, divisor):
+        """
+        Divides all counts by divisor
+        """
+        divisor = float(divisor)
+        if self.useNumpy():
+            self.asArray()[:] /= divisor
+        else:
+            self.counts = array.array('d', [count / divisor for count in self.counts])
+
+    def copy(self):
+        """
+        Returns a copy of the counter over the same space
+        """
+        copy = DenseCounter(self.space)
+        copy.counts = array.array('d', self.counts)
+        copy.present = bytearray(self.present)
+        return copy
+
+    def __mul__(self, y):
+        """
+        Multiplying two counters gives the dot product of their vectors where
+        each unique label is a vector element.
+        """
+        if self.sharesSpace(y):
+            size = min(len(self.counts), len(y.counts))
+            if self.useNumpy() and y.useNumpy():
+                return float(numpy.dot(self.asArray()[:size], y.asArray()[:size]))
+            return sum(map(operator.mul, self.counts, y.counts))
+        return sum([self[key] * value for key, value in y.items()])
+
+    def combine(self, y, sign):
+        """
+        Returns a counter over the same space with the union of the keys of
+        both counters and sign times the counts of y added to these.
+        """
+        result = self.copy()
+        if not self.sharesSpace(y):
+            for key, value in y.items():
+                result[key] += sign * value
+            return result
+        result.grow(len(y.counts))
+        counts = y.counts
+        if sign != 1:
+            counts = array.array('d', [sign * count for count in counts])
+        size = len(counts)
+        result.counts[:size] = array.array('d', map(operator.add, result.counts[:size], counts))
+        present = y.present
+        result.present[:size] = bytes(map(operator.or_, result.present[:size], present))
+        return result
+
+    def __add__(self, y):
+        """
+        Adding two counters gives a counter with the union of all keys and
+        counts of the second added to counts of the first.
+        """
+        return self.combine(y, 1)
+
+    def __sub__(self, y):
+        """
+        Subtracting a counter from another gives a counter with the union of all keys and
+        counts of the second subtracted from counts of the first.
+        """
+        return self.combine(y, -1)
+
+    def __radd__(self, y):
+        """
+        Adding a counter or dictionary to a DenseCounter from the left gives
+        a new DenseCounter over the same space, like adding it from the
+        right.  The 0 that sum starts from is treated as an empty counter.
+        """
+        if isinstance(y, int) and y == 0:
+            return self.copy()
+        return self.combine(y, 1)
+
+
 def raiseNotDefined():
     fileName = inspect.stack()[1][1]
     line = inspect.stack()[1][2]
@@ -674,7 +1031,9 @@ def pause():
 # of active time outs.  Currently, questions which have test cases calling
 # this have all student code so wrapped.
 #
+import os
 import signal
+import threading
 import time
 
 
@@ -712,6 +1071,120 @@ class TimeoutFunction:
         return result
 
 
+def raiseInThread(threadId, exception):
+    """
+    Asks the interpreter to raise exception in the thread threadId the next
+    time it runs Python code, or cancels a pending request when exception is
+    None.
+    """
+    import ctypes
+    if exception is not None:
+        exception = ctypes.py_object(exception)
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(threadId), exception)
+
+
+class Watchdog:
+    """
+    A background thread holding the deadlines of every WatchdogTimeoutFunction
+    call in the process.  When a deadline passes it raises
+    TimeoutFunctionException in the thread making that call.  The exception
+    is delivered the next time the thread runs Python code, so a call blocked
+    inside C code is only stopped once it returns.
+    """
+
+    def __init__(self):
+        self.start()
+
+    def start(self):
+        # Also called in a child process after a fork, where the thread of
+        # the parent does not exist and its lock may have been held.
+        self.pid = os.getpid()
+        self.condition = threading.Condition()
+        self.deadlines = []
+        self.armed = {}
+        self.serial = 0
+        thread = threading.Thread(target=self.run, name='Watchdog')
+        thread.daemon = True
+        thread.start()
+
+    def arm(self, timeout):
+        """
+        Starts timing a call from the current thread, returning a serial
+        number to pass to disarm.
+        """
+        if self.pid != os.getpid():
+            self.start()
+        with self.condition:
+            self.serial += 1
+            entry = (time.monotonic() + timeout, self.serial)
+            heapq.heappush(self.deadlines, entry)
+            self.armed[self.serial] = threading.get_ident()
+            if self.deadlines[0] == entry:
+                self.condition.notify()
+            return self.serial
+
+    def disarm(self, serial):
+        """
+        Stops timing a call, returning True if its deadline had already
+        passed.  Any exception raised for it that has not been delivered yet
+        is cancelled, so it cannot escape once the call is over.
+        """
+        with self.condition:
+            if self.armed.pop(serial, None) is not None:
+                return False
+            raiseInThread(threading.get_ident(), None)
+            return True
+
+    def run(self):
+        with self.condition:
+            while True:
+                while self.deadlines and self.deadlines[0][1] not in self.armed:
+                    heapq.heappop(self.deadlines)
+                if not self.deadlines:
+                    self.condition.wait()
+                    continue
+                deadline, serial = self.deadlines[0]
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self.condition.wait(remaining)
+                    continue
+                heapq.heappop(self.deadlines)
+                raiseInThread(self.armed.pop(serial), TimeoutFunctionException)
+
+
+_WATCHDOG = None
+_WATCHDOG_LOCK = threading.Lock()
+
+
+class WatchdogTimeoutFunction:
+    """
+    Like TimeoutFunction, but enforced by a shared watchdog thread instead of
+    SIGALRM.  The timeout may be a fraction of a second, nothing is installed
+    or removed around each call, and the function may be called from any
+    thread, so timed games can be run concurrently.
+    """
+
+    def __init__(self, function, timeout):
+        self.timeout = timeout
+        self.function = function
+
+    def __call__(self, *args, **keyArgs):
+        global _WATCHDOG
+        if self.timeout <= 0:
+            raise TimeoutFunctionException()
+        with _WATCHDOG_LOCK:
+            if _WATCHDOG is None:
+                _WATCHDOG = Watchdog()
+            watchdog = _WATCHDOG
+        serial = watchdog.arm(self.timeout)
+        try:
+            result = self.function(*args, **keyArgs)
+        finally:
+            if watchdog.disarm(serial):
+                raise TimeoutFunctionException()
+        return result
+
+
 _ORIGINAL_STDOUT = None
 _ORIGINAL_STDERR = None
 _MUTED = False
@@ -31,6 +31,12 @@ import mdp, util
 from learningAgents import ValueEstimationAgent
 import collections
 
+try:
+    import numpy
+    _NUMPY_ENABLED = True
+except ImportError:
+    _NUMPY_ENABLED = False
+
 class ValueIterationAgent(ValueEstimationAgent):
     """
         * Please read learningAgents.py before reading this.*
@@ -57,6 +63,7 @@ class ValueIterationAgent(ValueEstimationAgent):
         self.discount = discount
         self.iterations = iterations
         self.values = util.Counter() # A Counter is a dict with default 0
+        self.backups = 0 # Number of single state updates, for convergenceReport
         self.runValueIteration()
 
     def runValueIteration(self):
@@ -79,6 +86,8 @@ class ValueIterationAgent(ValueEstimationAgent):
                         max_val = computed_q_value
                     # Update new values each time
                     new_values[state] = max_val
+                if mdp_actions:
+                    self.backups += 1
             self.values = new_values
 
     def getValue(self, state):
@@ -128,6 +137,25 @@ class ValueIterationAgent(ValueEstimationAgent):
         return computed_action
 
 
+    def computeResidual(self, state):
+        """
+          The Bellman residual |V(s) - max_a Q(s, a)| of state under the
+          current values, or 0 if state has no actions.
+        """
+        actions = self.mdp.getPossibleActions(state)
+        if not actions:
+            return 0.0
+        best = max([self.computeQValueFromValues(state, action) for action in actions])
+        return abs(self.values[state] - best)
+
+    def convergenceReport(self):
+        """
+          The number of backups performed and the largest remaining Bellman
+          residual, for comparing how quickly agents converge.
+        """
+        maxResidual = max([self.computeResidual(state) for state in self.mdp.getStates()])
+        return 'backups %d, max residual %g' % (self.backups, maxResidual)
+
     def getPolicy(self, state):
         return self.computeActionFromValues(state)
 
@@ -138,6 +166,126 @@ class ValueIterationAgent(ValueEstimationAgent):
     def getQValue(self, state, action):
         return self.computeQValueFromValues(state, action)
 
+class CompiledMDP:
+    """
+        An mdp flattened once into arrays, so that Bellman backups don't
+        call back into it.  States are numbered in mdp.getStates() order.
+        Every (state, legal action) pair is a row; the rows of state i are
+        rowStart[i]:rowStart[i + 1], in mdp.getPossibleActions order, and
+        the transitions of row r are entryStart[r]:entryStart[r + 1] in the
+        nextStates, probs and rewards arrays.  When NumPy is installed the
+        arrays are NumPy arrays and each backup is a handful of vectorized
+        operations; otherwise they are lists swept in plain Python.
+    """
+    def __init__(self, mdp):
+        self.states = mdp.getStates()
+        self.stateIndex = dict((state, i) for i, state in enumerate(self.states))
+        self.actions = []
+        self.rowStart = [0]
+        self.entryStart = [0]
+        self.entryRow = []
+        self.nextStates = []
+        self.probs = []
+        self.rewards = []
+        for state in self.states:
+            actions = list(mdp.getPossibleActions(state))
+            self.actions.append(actions)
+            for action in actions:
+                row = len(self.entryStart) - 1
+                for nextState, prob in mdp.getTransitionStatesAndProbs(state, action):
+                    self.entryRow.append(row)
+                    self.nextStates.append(self.stateIndex[nextState])
+                    self.probs.append(prob)
+                    self.rewards.append(mdp.getReward(state, action, nextState))
+                self.entryStart.append(len(self.nextStates))
+            self.rowStart.append(len(self.entryStart) - 1)
+        self.numRows = len(self.entryStart) - 1
+
+        if _NUMPY_ENABLED:
+            self.entryRow = numpy.array(self.entryRow, dtype=int)
+            self.nextStates = numpy.array(self.nextStates, dtype=int)
+            self.probs = numpy.array(self.probs, dtype=float)
+            self.rewards = numpy.array(self.rewards, dtype=float)
+            starts = numpy.array(self.rowStart[:-1], dtype=int)
+            # States with no actions keep a value of 0
+            self.hasActions = starts < numpy.array(self.rowStart[1:], dtype=int)
+            self.groupStarts = starts[self.hasActions]
+
+    def initialValues(self):
+        if _NUMPY_ENABLED:
+            return numpy.zeros(len(self.states))
+        return [0] * len(self.states)
+
+    def getRow(self, state, action):
+        i = self.stateIndex[state]
+        return self.rowStart[i] + self.actions[i].index(action)
+
+    def qValue(self, row, values, discount):
+        """
+          The Q-value of a row given values, a sequence of state values
+          indexed by state number.
+        """
+        qValue = 0
+        for entry in range(self.entryStart[row], self.entryStart[row + 1]):
+            qValue += self.probs[entry] * (self.rewards[entry] + discount * values[self.nextStates[entry]])
+        return qValue
+
+    def qValues(self, values, discount):
+        "The Q-values of all rows at once."
+        if _NUMPY_ENABLED:
+            weights = self.probs * (self.rewards + discount * values[self.nextStates])
+            return numpy.bincount(self.entryRow, weights, minlength=self.numRows)
+        qValues = [0] * self.numRows
+        probs, rewards, nextStates = self.probs, self.rewards, self.nextStates
+        for entry, row in enumerate(self.entryRow):
+            qValues[row] += probs[entry] * (rewards[entry] + discount * values[nextStates[entry]])
+        return qValues
+
+    def bellmanBackup(self, values, discount):
+        """
+          One synchronous value iteration sweep: returns the new value of
+          every state, the best Q-value of its actions.
+        """
+        qValues = self.qValues(values, discount)
+        if _NUMPY_ENABLED:
+            newValues = numpy.zeros(len(self.states))
+            if len(self.groupStarts) > 0:
+                newValues[self.hasActions] = numpy.maximum.reduceat(qValues, self.groupStarts)
+            return newValues
+        rowStart = self.rowStart
+        newValues = [0] * len(self.states)
+        for i in range(len(self.states)):
+            if rowStart[i] < rowStart[i + 1]:
+                newValues[i] = max(qValues[rowStart[i]:rowStart[i + 1]])
+        return newValues
+
+    def asCounter(self, values):
+        counter = util.Counter()
+        for i, state in enumerate(self.states):
+            counter[state] = float(values[i])
+        return counter
+
+class VectorizedValueIterationAgent(ValueIterationAgent):
+    """
+        A ValueIterationAgent that compiles the mdp into a CompiledMDP once
+        and runs every iteration as a single batched Bellman backup, with
+        NumPy when it is available.  getValue, getQValue and getPolicy
+        agree with ValueIterationAgent up to floating point rounding.
+    """
+    def runValueIteration(self):
+        self.compiled = CompiledMDP(self.mdp)
+        values = self.compiled.initialValues()
+        statesWithActions = len([actions for actions in self.compiled.actions if actions])
+        for i in range(self.iterations):
+            values = self.compiled.bellmanBackup(values, self.discount)
+            self.backups += statesWithActions
+        self.stateValues = values
+        self.values = self.compiled.asCounter(values)
+
+    def computeQValueFromValues(self, state, action):
+        row = self.compiled.getRow(state, action)
+        return float(self.compiled.qValue(row, self.stateValues, self.discount))
+
 class AsynchronousValueIterationAgent(ValueIterationAgent):
     """
         * Please read learningAgents.py before reading this.*
@@ -181,6 +329,7 @@ class AsynchronousValueIterationAgent(ValueIterationAgent):
                     if q_value > max_val:
                         max_val = q_value
                 self.values[state] = max_val
+                self.backups += 1
 
 class PrioritizedSweepingValueIterationAgent(AsynchronousValueIterationAgent):
     """
@@ -200,5 +349,37 @@ class PrioritizedSweepingValueIterationAgent(AsynchronousValueIterationAgent):
         ValueIterationAgent.__init__(self, mdp, discount, iterations)
 
     def runValueIteration(self):
-        "*** YOUR CODE HERE ***"
+        states = self.mdp.getStates()
+
+        # Predecessors of each state: the states with a nonzero chance of
+        # reaching it, each listed once and in getStates order
+        predecessors = dict((state, []) for state in states)
+        for state in states:
+            for action in self.mdp.getPossibleActions(state):
+                for nextState, prob in self.mdp.getTransitionStatesAndProbs(state, action):
+                    stateList = predecessors[nextState]
+                    # Transitions are visited state by state, so a repeat
+                    # can only be at the end of the list
+                    if prob > 0 and (not stateList or stateList[-1] != state):
+                        stateList.append(state)
+
+        # util.PriorityQueue keeps an index of its items, so update lowers
+        # the priority of a queued state in O(log n)
+        queue = util.PriorityQueue()
+        for state in states:
+            if not self.mdp.isTerminal(state):
+                queue.push(state, -self.computeResidual(state))
+
+        for i in range(self.iterations):
+            if queue.isEmpty():
+                break
+            state = queue.pop()
+            if not self.mdp.isTerminal(state):
+                actions = self.mdp.getPossibleActions(state)
+                self.values[state] = max([self.computeQValueFromValues(state, action) for action in actions])
+                self.backups += 1
+            for predecessor in predecessors[state]:
+                diff = self.computeResidual(predecessor)
+                if diff > self.theta:
+                    queue.update(predecessor, -diff)
 